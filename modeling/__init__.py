@@ -6,6 +6,14 @@ the Rauzy Language. Most of the API functions are type-checked at runtime to
 ensure the types of the inputs. If one gets an exception related with types, one
 should look at the documentation for the types asked by a the function.
 
+The type checking can be made cheaper or removed by setting the RAUZY_TYPECHECK
+environment variable, or by calling :func:`modeling.typechecker.set_mode`
+before importing the modules:
+
+- "full" (default) checks the types using a generic proxy,
+- "fast" checks the types using a guard generated for each function,
+- "off" does not check the types and adds no overhead at all.
+
 To launch the modules contained in the modeling package as simple scripts use:
 
 >>> python3 -m modeling.core
@@ -13,4 +21,4 @@ To launch the modules contained in the modeling package as simple scripts use:
 for the core module for example.
 """
 
-__all__ = ["core", "model", "library"]
+__all__ = ["core", "model", "library", "stream", "binary", "journal"]
@@ -0,0 +1,498 @@
+r"""
+.. module:: binary
+
+The binary module reads and writes models and libraries in a compact binary
+format, which is much faster to load than json. It only needs the `struct`
+module: the files are read through a `memoryview`, without copying them.
+
+A file in the binary format contains the same data as the json files written by
+:meth:`modeling.model.Model.save` and :meth:`modeling.library.Library.save`:
+converting a json file to the binary format and back gives the same json file.
+All the integers are little-endian. The file is made of:
+
+- a header: the magic bytes ``RZYB``, the version of the format, the nature of
+  the root (0 for an object, 1 for a library), the number of strings, the
+  number of nodes and the offsets of the string table and of the node table,
+- the root: for an object, the index of its node and the string of its
+  library; for a library, the (name, node) pairs of its object classes and
+  then the ones of its relation classes, each list being prefixed by its
+  length,
+- the string table: the offsets of the strings, followed by the offset of
+  the end of the table and by the strings. The names, extends fields and
+  properties are given by their index in this table,
+- the node table: the offsets of the nodes, followed by the nodes. An object
+  node contains its extends field, followed by its (name, node) sub-objects,
+  its (name, node) relations and its properties, each list being prefixed by
+  its length. A relation node contains its extends and directional fields,
+  followed by its from and to sets and its properties.
+
+Structurally equal objects (see :meth:`modeling.core.Object.fingerprint`) are
+written only once, but they are loaded as distinct objects.
+
+Thanks to the offsets of the nodes and of the strings, a file can also be
+loaded lazily (see :func:`load_lazy`): it is mapped in memory and the
+sub-objects, relations and properties of an object are only read when they
+are first accessed.
+
+Converting a json model file to the binary format::
+
+  >>> from modeling.binary import *
+  >>> convert('examples/car.model', 'car.rzb')
+
+The same conversion from the command line::
+
+  python3 -m modeling.binary examples/car.model car.rzb
+"""
+
+import os, sys, json, mmap, struct, collections, collections.abc
+from . import core
+from .stream import load_json, save_json, _write_atomic
+
+__all__ = ["MAGIC", "EXTENSIONS", "is_binary", "dumps", "loads", "load_lazy",
+           "save", "convert"]
+
+MAGIC = b"RZYB"
+VERSION = 2
+# Extensions of the files in the binary format
+EXTENSIONS = (".rzb",)
+
+# magic, version, nature, number of strings, number of nodes, offset of the
+# string table, offset of the node table
+_HEADER = struct.Struct("<4sHBxIIQQ")
+_U32 = struct.Struct("<I")
+_OFFSET = struct.Struct("<Q")
+# Offsets of a string and of the following one
+_BOUNDS = struct.Struct("<QQ")
+# (name, node) and (key, tag, value) entries
+_PAIR = struct.Struct("<II")
+_PROPERTY = struct.Struct("<IBI")
+# kind, extends, number of objects, of relations and of properties
+_OBJECT = struct.Struct("<BIIII")
+# kind, extends, directional, size of the from set, of the to set and number
+# of properties
+_RELATION = struct.Struct("<BIBIII")
+
+_OBJECT_NATURE, _LIBRARY_NATURE = 0, 1
+_OBJECT_KIND, _RELATION_KIND = 0, 1
+# Tags of the property values: strings or other json values
+_STRING, _JSON = 0, 1
+# Index of a missing string
+_NONE = 0xFFFFFFFF
+_DIRECTIONALS = [False, True, None]
+
+def is_binary(file):
+  """is_binary(file)
+  Tell if `file` is in the binary format.
+
+  For a bytes buffer, it checks the magic bytes. For a path or a file object,
+  it checks the extension of its name."""
+  if isinstance(file, (bytes, bytearray, memoryview)):
+    return bytes(file[:len(MAGIC)]) == MAGIC
+  name = getattr(file, "name", file)
+  return isinstance(name, str) and os.path.splitext(name)[1] in EXTENSIONS
+
+class _Writer:
+  """Encode objects and relations into a string table and a node table."""
+  def __init__(self):
+    self.strings = {}
+    self.nodes = []
+    self.shared = {}
+
+  def string(self, value):
+    """Return the index of `value` in the string table."""
+    if value is None:
+      return _NONE
+    index = self.strings.get(value)
+    if index is None:
+      index = self.strings[value] = len(self.strings)
+    return index
+
+  def add(self, node):
+    """Return the index of the object or relation `node` in the node table,
+    encoding it with its sub-objects if needed."""
+    stack = []
+    index = self._reserve(node, stack)
+    while stack:
+      node, node_index = stack.pop()
+      if isinstance(node, core.Relation):
+        self.nodes[node_index] = self._relation(node)
+      else:
+        self.nodes[node_index] = self._object(node, stack)
+    return index
+
+  def _reserve(self, node, stack):
+    """Return the index of `node`, adding it into `stack` if it still has to
+    be encoded."""
+    key = None
+    if isinstance(node, core.Object):
+      key = node.fingerprint()
+      if key in self.shared:
+        return self.shared[key]
+    index = len(self.nodes)
+    self.nodes.append(None)
+    if key is not None:
+      self.shared[key] = index
+    stack.append((node, index))
+    return index
+
+  def _object(self, obj, stack):
+    objects = obj.objects
+    relations = obj.relations
+    properties = obj.properties
+    parts = [_OBJECT.pack(_OBJECT_KIND, self.string(obj.extends), len(objects),
+                          len(relations), len(properties))]
+    for name, sub_obj in objects.items():
+      parts.append(_PAIR.pack(self.string(name), self._reserve(sub_obj, stack)))
+    for name, rlt in relations.items():
+      parts.append(_PAIR.pack(self.string(name), self._reserve(rlt, stack)))
+    parts.extend(self._properties(properties))
+    return b"".join(parts)
+
+  def _relation(self, rlt):
+    if rlt.directional not in _DIRECTIONALS:
+      raise TypeError("The directional field of a relation must be a boolean "
+                      "or None.")
+    properties = rlt.properties
+    parts = [_RELATION.pack(_RELATION_KIND, self.string(rlt.extends),
+                            _DIRECTIONALS.index(rlt.directional),
+                            len(rlt.fromSet), len(rlt.toSet), len(properties))]
+    for endpoints in (rlt.fromSet, rlt.toSet):
+      for name in endpoints:
+        parts.append(_U32.pack(self.string(name)))
+    parts.extend(self._properties(properties))
+    return b"".join(parts)
+
+  def _properties(self, properties):
+    for key, value in properties.items():
+      if isinstance(value, str):
+        yield _PROPERTY.pack(self.string(key), _STRING, self.string(value))
+      else:
+        yield _PROPERTY.pack(self.string(key), _JSON,
+                             self.string(json.dumps(value)))
+
+  def dumps(self, nature, root):
+    """Return the content of a file whose encoded root is `root`."""
+    strings = [string.encode("utf-8") for string in self.strings]
+    strings_offset = _HEADER.size + len(root)
+    string_offsets = []
+    offset = strings_offset + _OFFSET.size * (len(strings) + 1)
+    for string in strings:
+      string_offsets.append(_OFFSET.pack(offset))
+      offset += len(string)
+    string_offsets.append(_OFFSET.pack(offset))
+    string_table = b"".join(string_offsets + strings)
+    nodes_offset = strings_offset + len(string_table)
+    offsets = []
+    offset = nodes_offset + _OFFSET.size * len(self.nodes)
+    for node in self.nodes:
+      offsets.append(_OFFSET.pack(offset))
+      offset += len(node)
+    header = _HEADER.pack(MAGIC, VERSION, nature, len(strings), len(self.nodes),
+                          strings_offset, nodes_offset)
+    return b"".join([header, root, string_table] + offsets + self.nodes)
+
+def dumps(value, library_path=None):
+  """dumps(value, library_path=None)
+  Return the binary representation of `value`.
+
+  `value` can be an object, a library, or the json data of a model or of a
+  library (see :func:`modeling.stream.load_json`). `library_path` is the
+  library of an object, as written by :meth:`modeling.model.Model.save`."""
+  if isinstance(value, collections.abc.Mapping):
+    nature = core._nature(value)
+    if nature == "library":
+      classes = [core._objects(value) or {}, core._relations(value) or {}]
+      for i, new in enumerate((core.Object.new, core.Relation.new)):
+        classes[i] = collections.OrderedDict(
+          (name, node if isinstance(node, (core.Object, core.Relation))
+                 else new(node, None))
+          for name, node in classes[i].items())
+      return _dumps_library(*classes)
+    if nature != "object":
+      raise Exception("This is not a valid dictionary")
+    if library_path is None:
+      library_path = core._library(value)
+    value = core.Object.new(value, None)
+  elif hasattr(value, "dic_obj") and hasattr(value, "dic_rlt"):
+    return _dumps_library(value.dic_obj, value.dic_rlt)
+
+  writer = _Writer()
+  root = _PAIR.pack(writer.add(value), writer.string(library_path))
+  return writer.dumps(_OBJECT_NATURE, root)
+
+def _dumps_library(dic_obj, dic_rlt):
+  writer = _Writer()
+  root = []
+  for classes in (dic_obj, dic_rlt):
+    root.append(_U32.pack(len(classes)))
+    for name, node in classes.items():
+      root.append(_PAIR.pack(writer.string(name), writer.add(node)))
+  return writer.dumps(_LIBRARY_NATURE, b"".join(root))
+
+class _Reader:
+  """Decode the nodes of the binary representation `data`."""
+  def __init__(self, data):
+    self.data = memoryview(data)
+    if bytes(self.data[:len(MAGIC)]) != MAGIC:
+      raise Exception("This is not a file in the binary format")
+    (magic, version, self.nature, n_strings, self.n_nodes, self.strings_offset,
+     self.nodes_offset) = _HEADER.unpack_from(self.data, 0)
+    if version != VERSION:
+      raise Exception("The version " + str(version) + " of the binary format "
+                      "is not supported")
+    self.cache = {}
+
+  def text(self, index):
+    """Return the string at `index` in the string table. The strings are only
+    decoded when they are needed."""
+    value = self.cache.get(index)
+    if value is None:
+      start, end = _BOUNDS.unpack_from(
+        self.data, self.strings_offset + _OFFSET.size * index)
+      value = self.cache[index] = str(self.data[start:end], "utf-8")
+    return value
+
+  def string(self, index):
+    return None if index == _NONE else self.text(index)
+
+  def name(self, index):
+    return sys.intern(self.text(index))
+
+  def _entries(self, entry, offset, count):
+    """Return the iterator over the `count` entries of the struct `entry` at
+    `offset`, and the offset following them."""
+    end = offset + entry.size * count
+    return entry.iter_unpack(self.data[offset:end]), end
+
+  def _node(self, index, node_struct, kind):
+    """Return the fields of the node at `index`, which must be a `kind` node
+    described by `node_struct`, and the offset of its lists."""
+    (offset,) = _OFFSET.unpack_from(self.data,
+                                    self.nodes_offset + _OFFSET.size * index)
+    fields = node_struct.unpack_from(self.data, offset)
+    if fields[0] != kind:
+      raise Exception("The node " + str(index) + " is not of the expected kind")
+    return fields, offset + node_struct.size
+
+  def object_node(self, index):
+    """Return the extends field, the (name, node) entries of the sub-objects
+    and of the relations, and the offset and the number of the properties of
+    the object at `index`."""
+    (kind, extends, n_objects, n_relations, n_properties), offset = \
+      self._node(index, _OBJECT, _OBJECT_KIND)
+    objects, offset = self._entries(_PAIR, offset, n_objects)
+    relations, offset = self._entries(_PAIR, offset, n_relations)
+    return extends, list(objects), list(relations), offset, n_properties
+
+  def object_dict(self, index):
+    """Return the json data of the object at `index`, its sub-objects and
+    relations being already built."""
+    extends, objects, relations, offset, n_properties = self.object_node(index)
+    result = collections.OrderedDict()
+    result["nature"] = "object"
+    if extends != _NONE:
+      result["extends"] = self.text(extends)
+    if objects:
+      result["objects"] = collections.OrderedDict(
+        (self.name(name), self.object(node)) for name, node in objects)
+    if relations:
+      result["relations"] = collections.OrderedDict(
+        (self.name(name), self.relation(node)) for name, node in relations)
+    if n_properties:
+      result["properties"] = self.properties(offset, n_properties)
+    return result
+
+  def object(self, index):
+    """Return the object at `index`. The sub-objects are built iteratively."""
+    root = core.Object()
+    stack = [(root, index)]
+    all_relations = []
+    while stack:
+      obj, index = stack.pop()
+      extends, objects, relations, offset, n_properties = \
+        self.object_node(index)
+      obj.extends = self.string(extends)
+      for name, node in objects:
+        sub_obj = core.Object()
+        obj._attach_object(self.name(name), sub_obj)
+        stack.append((sub_obj, node))
+      if relations:
+        obj._relations = self.relations(obj, relations)
+        all_relations.extend(obj._relations.values())
+      if n_properties:
+        obj._properties = self.properties(offset, n_properties)
+
+    # The linked objects are looked up once all the objects have been built
+    for rlt in all_relations:
+      rlt._resolve_endpoints()
+    # A loaded object is not dirty
+    root.mark_clean()
+    return root
+
+  def relations(self, obj, entries):
+    """Return the relations of `obj` given by their (name, node) `entries`.
+    Their linked objects are not looked up."""
+    relations = {}
+    for name, node in entries:
+      rlt = self.relation(node)
+      rlt.parent = obj
+      rlt._name = name = self.name(name)
+      relations[name] = rlt
+    return relations
+
+  def relation(self, index):
+    """Return the relation at `index`, with its linked objects set to None."""
+    (kind, extends, directional, n_from, n_to, n_properties), offset = \
+      self._node(index, _RELATION, _RELATION_KIND)
+    rlt = core.Relation()
+    rlt.extends = self.string(extends)
+    rlt.directional = _DIRECTIONALS[directional]
+    entries, offset = self._entries(_U32, offset, n_from)
+    if n_from:
+      rlt.fromSet = dict.fromkeys(self.name(name) for (name,) in entries)
+    entries, offset = self._entries(_U32, offset, n_to)
+    if n_to:
+      rlt.toSet = dict.fromkeys(self.name(name) for (name,) in entries)
+    if n_properties:
+      rlt._properties = self.properties(offset, n_properties)
+    return rlt
+
+  def properties(self, offset, count):
+    properties = {}
+    entries, offset = self._entries(_PROPERTY, offset, count)
+    for key, tag, value in entries:
+      value = self.text(value)
+      if tag == _JSON:
+        value = json.loads(value)
+      properties[self.name(key)] = value
+    return properties
+
+  def root(self):
+    """Return the json data of the root, as :func:`stream.load_json` does."""
+    offset = _HEADER.size
+    if self.nature == _OBJECT_NATURE:
+      index, library = _PAIR.unpack_from(self.data, offset)
+      result = self.object_dict(index)
+      result["library"] = self.string(library)
+      return result
+    return self.library_dict(self.object)
+
+  def lazy_root(self):
+    """Return the (root, library) pair of :func:`load_lazy`."""
+    if self.nature == _OBJECT_NATURE:
+      index, library = _PAIR.unpack_from(self.data, _HEADER.size)
+      return _MappedObject(self, index), self.string(library)
+    return self.library_dict(lambda node: _MappedObject(self, node)), None
+
+  def library_dict(self, read_object):
+    """Return the json data of a library, its object classes being read by
+    `read_object`."""
+    offset = _HEADER.size
+    result = collections.OrderedDict()
+    result["nature"] = "library"
+    for key, read in (("objects", read_object), ("relations", self.relation)):
+      (count,) = _U32.unpack_from(self.data, offset)
+      entries, offset = self._entries(_PAIR, offset + _U32.size, count)
+      result[key] = collections.OrderedDict(
+        (self.name(name), read(node)) for name, node in entries)
+    return result
+
+class _MappedObject(core._LazyObject):
+  """Object of a file in the binary format loaded by :func:`load_lazy`.
+
+  Its containers are read from the node `_node` of `_reader` when they are
+  first accessed. The sub-objects are themselves _MappedObject."""
+  __slots__ = ("_reader", "_node")
+
+  def __init__(self, reader, node):
+    core._LazyObject.__init__(self)
+    self._reader = reader
+    self._node = node
+    (kind, extends, n_objects, n_relations, n_properties), offset = \
+      reader._node(node, _OBJECT, _OBJECT_KIND)
+    self.extends = reader.string(extends)
+
+  def _build_objects(self):
+    entries = self._reader.object_node(self._node)[1]
+    if not entries:
+      return None
+    return {self._reader.name(name): _MappedObject(self._reader, node)
+            for name, node in entries}
+
+  def _build_relations(self):
+    entries = self._reader.object_node(self._node)[2]
+    if not entries:
+      return None
+    return self._reader.relations(self, entries)
+
+  def _build_properties(self):
+    extends, objects, relations, offset, n_properties = \
+      self._reader.object_node(self._node)
+    if not n_properties:
+      return None
+    return self._reader.properties(offset, n_properties)
+
+def loads(data):
+  """loads(data)
+  Return the json data of the binary representation `data` (bytes or any
+  buffer).
+
+  As for :func:`modeling.stream.load_json`, the objects and relations contained
+  in the root are already built. The root can be given to
+  :meth:`core.Object.new` or to :meth:`library.Library.load`."""
+  return _Reader(data).root()
+
+def load_lazy(file):
+  """load_lazy(file)
+  Load lazily the binary representation `file`, which can be a path, a file
+  object or a bytes buffer. A path or a file object is mapped in memory.
+
+  For a model, it returns the (root object, path of the library) pair: the
+  sub-objects, relations and properties of the objects are only read when
+  they are first accessed, through the usual API. For a library, it returns
+  the (json data, None) pair, the json data being the one of :func:`loads`
+  with lazily read object classes.
+
+  The file must not be modified in place while its objects are in use. It can
+  be replaced by :func:`save`, which writes a new file."""
+  if isinstance(file, (bytes, bytearray, memoryview)):
+    data = file
+  elif hasattr(file, "fileno"):
+    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+  else:
+    with open(file, "rb") as binary_file:
+      data = mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ)
+  return _Reader(data).lazy_root()
+
+def save(value, path, library_path=None):
+  """save(value, path, library_path=None)
+  Write the binary representation of `value` (see :func:`dumps`) into the
+  file `path`. As :func:`modeling.stream.save_json`, it replaces the file
+  atomically."""
+  _write_atomic(path, [dumps(value, library_path)], binary=True)
+
+def convert(source, destination, indent=1):
+  """convert(source, destination, indent=1)
+  Convert the model or library file `source` into `destination`.
+
+  The format of each file is given by its extension (see :data:`EXTENSIONS`):
+  a json file is converted into the binary format and conversely. `indent` is
+  the indentation of the json output."""
+  if is_binary(source):
+    with open(source, "rb") as source_file:
+      root = loads(source_file.read())
+  else:
+    root = load_json(source)
+
+  if is_binary(destination):
+    save(root, destination)
+  else:
+    save_json(root, destination, indent)
+
+if __name__ == "__main__":
+  if len(sys.argv) != 3:
+    print("Usage: python3 -m modeling.binary source destination")
+    print("Convert a model or a library between the json and the binary "
+          "formats, according to the extensions of the files.")
+    sys.exit(1)
+  convert(sys.argv[1], sys.argv[2])
@@ -16,9 +16,10 @@ Example of the initialization and the addition of an object class::
 """
 
 # Import built-in modules
-import json, collections
+import json, collections, hashlib, sys, functools
 from pprint import pprint
 from copy import deepcopy
+from types import MappingProxyType
 
 # Import user modules
 from .typechecker import *
@@ -69,39 +70,598 @@ def _directional(obj):
 def _library(obj):
   return _get_value(obj, "library")
 
+def _index_update(index, entries, delta):
+  """Add (`delta` = 1) or remove (`delta` = -1) the (parent, name, obj)
+  `entries` in the name `index`.
+
+  The index maps a name to its parent when there is a single object with
+  this name. Otherwise, it maps the name to a dictionary
+  {id(parent): [parent, count]}, count being the number of paths leading to
+  this parent (a same object may be contained several times in a
+  hierarchy), and goes back to the parent when a single path is left.
+
+  The property indexes are maintained by the same function, their entries
+  being (obj, (key, value), None) triples (see :func:`_property_entries`)."""
+  for parent, name, obj in entries:
+    parents = index.get(name)
+    if parents is None:
+      if delta > 0:
+        index[name] = parent
+      continue
+    if not isinstance(parents, dict):
+      if delta < 0:
+        if parents is parent:
+          del index[name]
+        continue
+      parents = index[name] = {id(parents): [parents, 1]}
+    entry = parents.get(id(parent))
+    if entry is None:
+      entry = parents[id(parent)] = [parent, 0]
+    entry[1] += delta
+    if entry[1] <= 0:
+      del parents[id(parent)]
+    if not parents:
+      del index[name]
+    elif len(parents) == 1:
+      (last, count), = parents.values()
+      if count == 1:
+        index[name] = last
+
+def _index_values(entry):
+  """Return the list of the parents (or of the objects, for a property
+  index) of the `entry` of an index (see :func:`_index_update`)."""
+  if entry is None:
+    return []
+  if isinstance(entry, dict):
+    return [parent for parent, count in entry.values()]
+  return [entry]
+
+def _property_entries(obj):
+  """Yield the entries of the property indexes for `obj` and the objects of
+  its sub-hierarchy."""
+  for item in (obj._properties or {}).items():
+    yield obj, item, None
+  for parent, name, sub_obj in obj._iter_entries():
+    for item in (sub_obj._properties or {}).items():
+      yield sub_obj, item, None
+
+class _Container(dict):
+  """Dictionary stored in the `slot` attribute of the Object or Relation
+  `owner`, whose modifications are made by the owner (see
+  :meth:`Object._container_set`), so that the indexes and the caches of the
+  owner are kept up to date.
+
+  A container which is not stored in the slot yet (it is returned for an
+  empty container, which is None until it is modified) stores itself there
+  on its first modification."""
+  __slots__ = ("_owner", "_slot")
+
+  def __init__(self, owner, slot, items=()):
+    dict.__init__(self, items)
+    self._owner = owner
+    self._slot = slot
+
+  def _install(self):
+    current = getattr(self._owner, self._slot)
+    if current is not self:
+      if current:
+        dict.update(self, current)
+      setattr(self._owner, self._slot, self)
+
+  def __setitem__(self, key, value):
+    self._install()
+    self._owner._container_set(self._slot, key, value)
+
+  def __delitem__(self, key):
+    if key not in self:
+      raise KeyError(key)
+    self._install()
+    self._owner._container_del(self._slot, key)
+
+  def pop(self, key, *default):
+    if key not in self:
+      if default:
+        return default[0]
+      raise KeyError(key)
+    value = self[key]
+    del self[key]
+    return value
+
+  def popitem(self):
+    if not self:
+      raise KeyError("popitem(): dictionary is empty")
+    key = next(reversed(self))
+    return key, self.pop(key)
+
+  def clear(self):
+    for key in list(self):
+      del self[key]
+
+  def setdefault(self, key, default=None):
+    if key not in self:
+      self[key] = default
+    return self[key]
+
+  def update(self, *args, **kwargs):
+    for key, value in dict(*args, **kwargs).items():
+      self[key] = value
+
+  def __ior__(self, other):
+    self.update(other)
+    return self
+
+  def __reduce__(self):
+    return (dict, (dict(self),))
+
+def _container_property(slot, doc):
+  """Return a property giving access to the dictionary stored in `slot` as
+  a _Container. The dictionary is None until it is modified.
+
+  Assigning a dictionary to the property replaces the entries of the
+  container one by one, as done through the container."""
+  def getter(self):
+    value = getattr(self, slot)
+    if type(value) is not _Container:
+      if value is None:
+        return _Container(self, slot)
+      value = _Container(self, slot, value)
+      setattr(self, slot, value)
+    return value
+
+  def setter(self, value):
+    container = getter(self)
+    items = list(value.items())
+    container.clear()
+    container.update(items)
+    self._container_changed(slot)
+
+  return property(getter, setter, doc=doc)
+
 class Object:
-  """Abstract Rauzy object"""
+  """Abstract Rauzy object
+
+  Each object keeps the list of the objects containing it (`_parents`) and,
+  once a lookup has been done on it, an index of all the objects of its
+  sub-hierarchy (`_index`). The index maps a name to the parent having a
+  direct child with this name, or to all of them when there are several
+  (see :func:`_index_update`). It is maintained by :meth:`add_object` and
+  :meth:`remove_object` on the object and on all its ancestors.
+
+  Each object also keeps, once needed, a reverse index of the relations it
+  directly contains (`_endpoints`), mapping the name of a linked object to
+  these relations.
+
+  Once :meth:`find_by_property` has been called on it, an object also keeps
+  an index of the properties of its sub-hierarchy (`_property_index`),
+  mapping a (key, value) pair to the objects having this property. It is
+  maintained like the name index, and by the modifications of the properties
+  on the ancestors of the modified object.
+
+  The `objects` and `properties` dictionaries are :class:`_Container`
+  objects: writing in them is the same as calling :meth:`add_object`,
+  :meth:`remove_object`, :meth:`add_property` or :meth:`remove_property`,
+  without the checks.
+
+  The modifications made through the API since the object has been loaded
+  or saved are recorded in `_dirty`, which is None for a clean object. It
+  maps "objects", "relations" and "properties" to the dictionary of the
+  modified names, in the order of their first modification, telling if the
+  name has been removed in the meantime (None if the whole container has
+  been replaced), and "extends" to None if the extends field has been
+  modified. The ancestors of a dirty object are dirty, so that the
+  modifications are found by only visiting the dirty objects (see
+  :mod:`modeling.journal`). An object which has never been loaded or saved
+  has no journal to write its modifications to: they are not recorded, and
+  `_dirty` only tells if it has been modified (False or True).
+
+  Objects are compared using their :meth:`fingerprint`. As the fingerprint
+  changes when an object is modified, an object must not be modified while
+  it is used as a key of a dictionary or is in a set.
+
+  To keep the memory footprint of large models low, the attributes are
+  stored in slots and the `objects`, `relations` and `properties`
+  dictionaries, as well as the list of parents, are only created when
+  something is put in them. The names and the property keys are interned."""
+  __slots__ = ("extends", "_objects", "_relations", "_properties",
+               "_parents", "_index", "_property_index", "_endpoints",
+               "_fingerprint", "_dirty")
+
   def __init__(self):
     self.extends = None
-    self.objects = {}
-    self.relations = {}
-    self.properties = {}
+    self._objects = None
+    self._relations = None
+    self._properties = None
+    self._parents = None
+    self._index = None
+    self._property_index = None
+    self._endpoints = None
+    self._fingerprint = None
+    self._dirty = False
+
+  objects = _container_property("_objects",
+                                "Dictionary of the contained objects.")
+  relations = _container_property("_relations",
+                                  "Dictionary of the relations.")
+  properties = _container_property("_properties",
+                                   "Dictionary of the properties.")
+
+  def _own_properties(self):
+    """Return the dictionary of the properties in order to modify it,
+    creating it if needed."""
+    if self._properties is None:
+      self._properties = {}
+    return self._properties
+
+  def _container_changed(self, slot):
+    """Record that the whole container stored in `slot` has been replaced."""
+    self._modified(slot[1:])
+
+  def _container_set(self, slot, key, value):
+    """Set the entry `key` of the _Container stored in `slot` to `value`."""
+    if slot == "_objects":
+      if not isinstance(value, Object):
+        raise TypeError("The contained objects must be Objects")
+      self._attach_object(key, value)
+    elif slot == "_relations":
+      if not isinstance(value, Relation):
+        raise TypeError("The relations must be Relations")
+      self._attach_relation(key, value)
+    else:
+      self._set_property(key, value)
+
+  def _container_del(self, slot, key):
+    """Remove the entry `key` of the _Container stored in `slot`."""
+    if slot == "_objects":
+      self._detach_object(key)
+    elif slot == "_relations":
+      self._detach_relation(key)
+    else:
+      self._del_property(key)
+
+  def _modified(self, kind, key=None):
+    """Invalidate the fingerprint of the object and record that the entry
+    `key` of its container `kind` ("objects", "relations" or "properties")
+    has been modified. `key` None stands for the whole container, and `kind`
+    "extends" for the extends field.
+
+    The modification is only recorded if the object has been loaded or
+    saved (see :class:`Object`)."""
+    self._invalidate_fingerprint()
+    changes = self._dirty
+    if changes is None or changes is False:
+      changes = self._dirty = {} if changes is None else True
+      # The ancestors of a dirty object are dirty, hence we stop at the first
+      # one which is already dirty
+      stack = list(self._parents or ())
+      while stack:
+        obj = stack.pop()
+        if obj._dirty is None or obj._dirty is False:
+          obj._dirty = {} if obj._dirty is None else True
+          stack.extend(obj._parents or ())
+    if changes is True:
+      return
+    if key is None:
+      changes[kind] = None
+      return
+    names = changes.setdefault(kind, {})
+    if names is not None:
+      # A name which is not in the container anymore has been removed: it is
+      # added back at the end of the container if it is set again
+      removed = key not in (getattr(self, "_" + kind) or ())
+      names[key] = names.get(key, False) or removed
+
+  def is_dirty(self):
+    """is_dirty()
+    Tell if the object or one of its sub-objects has been modified through
+    the API since it has been loaded or saved (or created)."""
+    return self._dirty is not None and self._dirty is not False
+
+  def mark_clean(self):
+    """mark_clean()
+    Forget the modifications of the object, of its sub-objects and of their
+    relations, e.g. once they have been saved, and record the next ones (see
+    :class:`Object`). Only the modified objects are visited."""
+    stack = [self]
+    while stack:
+      obj = stack.pop()
+      if obj._dirty is None:
+        continue
+      obj._dirty = None
+      for rlt in (obj._relations or {}).values():
+        rlt._dirty = False
+      if obj._objects:
+        stack.extend(obj._objects.values())
+
+  def __getstate__(self):
+    # The parents and the index are not copied: a copy of a sub-hierarchy
+    # must not drag its ancestors along with it.
+    return { "extends": self.extends, "_objects": self._objects,
+             "_relations": self._relations, "_properties": self._properties }
+
+  def __eq__(self, other):
+    if not isinstance(other, Object):
+      return NotImplemented
+    return self is other or self.fingerprint() == other.fingerprint()
+
+  def __hash__(self):
+    return hash(self.fingerprint())
+
+  def fingerprint(self):
+    """fingerprint()
+    Return a structural hash of the object, as an hexadecimal string.
+
+    It covers the extends field, the properties, the relations and,
+    recursively, the contained objects. It is cached and the cache is
+    invalidated on the object and its ancestors when one of them is modified
+    through the API, so that it is only recomputed for the modified
+    sub-hierarchies."""
+    if self._fingerprint is None:
+      # The fingerprints of the sub-objects are computed first, from the
+      # deepest ones, so that the depth is not limited by the recursion limit
+      order = []
+      stack = [self]
+      while stack:
+        obj = stack.pop()
+        order.append(obj)
+        if obj._objects:
+          stack.extend(sub_obj for sub_obj in obj._objects.values()
+                       if sub_obj._fingerprint is None)
+      for obj in reversed(order):
+        if obj._fingerprint is None:
+          obj._fingerprint = obj._compute_fingerprint()
+    return self._fingerprint
+
+  def _compute_fingerprint(self):
+    """Return the fingerprint of the object, the ones of its sub-objects being
+    already computed."""
+    objects = self._objects or {}
+    relations = self._relations or {}
+    content = ("object", self.extends,
+               sorted((self._properties or {}).items()),
+               [(name, objects[name]._fingerprint)
+                for name in sorted(objects)],
+               [(name, relations[name].fingerprint())
+                for name in sorted(relations)])
+    return hashlib.sha1(repr(content).encode()).hexdigest()
+
+  def _invalidate_fingerprint(self):
+    """Invalidate the cached fingerprint of the object and of its ancestors."""
+    stack = [self]
+    while stack:
+      obj = stack.pop()
+      # If the fingerprint of an object is not cached, the ones of its
+      # ancestors are not either.
+      if obj._fingerprint is not None:
+        obj._fingerprint = None
+        stack.extend(obj._parents or ())
+
+  def __setstate__(self, state):
+    for key, value in state.items():
+      setattr(self, key, value)
+    self._index = None
+    self._property_index = None
+    self._endpoints = None
+    self._fingerprint = None
+    self._dirty = False
+    # The contained objects are restored before their parent
+    if not hasattr(self, "_parents"):
+      self._parents = None
+    for obj in (self._objects or {}).values():
+      if getattr(obj, "_parents", None) is None:
+        obj._parents = [self]
+      else:
+        obj._parents.append(self)
+
+  def _iter_entries(self):
+    """Yield the (parent, name, obj) triples of all the objects of the
+    sub-hierarchy, the current object excluded."""
+    if not self._objects:
+      return
+    # The parents are visited in preorder, as done by the recursive search
+    stack = [self]
+    while stack:
+      parent = stack.pop()
+      for name, obj in parent._objects.items():
+        yield parent, name, obj
+      stack.extend(reversed([obj for obj in parent._objects.values()
+                             if obj._objects]))
+
+  def _get_index(self):
+    """Return the name index of the sub-hierarchy, building it if needed."""
+    if self._index is None:
+      self._index = {}
+      _index_update(self._index, self._iter_entries(), 1)
+    return self._index
+
+  def _built_indexes(self, slot="_index"):
+    """Return the indexes stored in `slot` already built on the current
+    object and its ancestors. An ancestor appears once for each path leading
+    to it."""
+    result = []
+    stack = [self]
+    while stack:
+      obj = stack.pop()
+      index = getattr(obj, slot)
+      if index is not None:
+        result.append(index)
+      stack.extend(obj._parents or ())
+    return result
+
+  def _update_indexes(self, objects, delta):
+    """Add (`delta` = 1) or remove (`delta` = -1) the (name, obj) pairs
+    `objects`, direct sub-objects of the current object, and their
+    sub-hierarchies in the name and property indexes already built on the
+    current object and its ancestors."""
+    indexes = self._built_indexes()
+    if indexes:
+      entries = []
+      for name, obj in objects:
+        entries.append((self, name, obj))
+        entries.extend(obj._iter_entries())
+      for index in indexes:
+        _index_update(index, entries, delta)
+    indexes = self._built_indexes("_property_index")
+    if indexes:
+      entries = [entry for name, obj in objects
+                 for entry in _property_entries(obj)]
+      for index in indexes:
+        _index_update(index, entries, delta)
+
+  def _get_property_index(self):
+    """Return the property index of the sub-hierarchy, building it if
+    needed."""
+    if self._property_index is None:
+      self._property_index = {}
+      for obj in (self._objects or {}).values():
+        _index_update(self._property_index, _property_entries(obj), 1)
+    return self._property_index
+
+  def _property_changed(self, key, old, new):
+    """Update the property indexes of the ancestors, the value of the
+    property `key` having changed from `old` to `new` (None for a property
+    that is absent)."""
+    for parent in self._parents or ():
+      for index in parent._built_indexes("_property_index"):
+        if old is not None:
+          _index_update(index, [(self, (key, old), None)], -1)
+        if new is not None:
+          _index_update(index, [(self, (key, new), None)], 1)
+
+  def _set_property(self, key, value):
+    """Set the property `key` => `value`, whether it exists or not, and update
+    the property indexes."""
+    properties = self._own_properties()
+    old = properties.get(key)
+    dict.__setitem__(properties, sys.intern(key), value)
+    self._modified("properties", key)
+    self._property_changed(key, old, value)
+
+  def _del_property(self, key):
+    """Remove the property `key` and update the property indexes."""
+    value = dict.pop(self._own_properties(), key)
+    self._modified("properties", key)
+    self._property_changed(key, value, None)
+
+  def _get_endpoints(self):
+    """Return the reverse index of the relations of the object, building it
+    if needed. It maps an object name to the {name: relation} dictionary of
+    the relations linking it."""
+    if self._endpoints is None:
+      self._endpoints = {}
+      for name, rlt in self.relations.items():
+        self._endpoints_update(name, rlt, True)
+    return self._endpoints
+
+  def _endpoints_update(self, name, rlt, add):
+    """Add or remove the relation `rlt` named `name` in the reverse index."""
+    for obj_name in set(rlt.fromSet).union(rlt.toSet):
+      if add:
+        self._endpoints.setdefault(obj_name, {})[name] = rlt
+      else:
+        relations = self._endpoints[obj_name]
+        del relations[name]
+        if not relations:
+          del self._endpoints[obj_name]
+
+  def _attach_object(self, name, obj):
+    """Put `obj` under the name `name` and update the indexes."""
+    name = sys.intern(name)
+    if self._objects is None:
+      self._objects = {}
+    elif name in self._objects:
+      # The object is replaced in place, in order to keep the order of the
+      # objects
+      self._release_object(name, self._objects[name])
+    dict.__setitem__(self._objects, name, obj)
+    if obj._parents is None:
+      obj._parents = [self]
+    else:
+      obj._parents.append(self)
+    self._modified("objects", name)
+    self._update_indexes([(name, obj)], 1)
+
+  def _attach_objects(self, objects):
+    """Put the objects of the dictionary `objects` under their names and
+    update the indexes once for all of them."""
+    if self._objects is None:
+      self._objects = {}
+    for name, obj in objects.items():
+      name = sys.intern(name)
+      if name in self._objects:
+        self._release_object(name, self._objects[name])
+      dict.__setitem__(self._objects, name, obj)
+      if obj._parents is None:
+        obj._parents = [self]
+      else:
+        obj._parents.append(self)
+      self._modified("objects", name)
+    self._update_indexes(objects.items(), 1)
+
+  def _detach_object(self, name):
+    """Remove the object named `name` and update the indexes."""
+    obj = dict.pop(self._objects, name)
+    self._release_object(name, obj)
+    return obj
+
+  def _release_object(self, name, obj):
+    """Update the indexes and the parents of `obj`, which is no more the
+    object named `name` of the current object."""
+    for i, parent in enumerate(obj._parents or ()):
+      if parent is self:
+        del obj._parents[i]
+        break
+    self._modified("objects", name)
+    self._update_indexes([(name, obj)], -1)
 
   @staticmethod
-  def new(json_obj, library):
-    """Return an Object representation of the json object."""
+  def new(json_obj, library, lazy=False):
+    """Return an Object representation of the json object.
+
+    The contained objects and relations of the json object can also be already
+    built objects and relations.
+
+    If `lazy` is True, the json object is kept and the sub-objects, relations
+    and properties are only built when they are first accessed, through the
+    usual API. The sub-objects are built lazily too, so that the cost of a
+    query is proportional to the part of the hierarchy it reads. Reading the
+    relations of an object builds its whole sub-hierarchy, in order to look
+    up the linked objects. The json object must not be modified while the
+    object is in use."""
+    if lazy:
+      return _JsonObject(json_obj, library)
     ext = _extends(json_obj)
-    if ext is None:
-      obj = Object()
-    else:
-      obj = Object()
+    obj = Object()
+    if ext is not None:
       obj.extends = ext
       # obj = library.instanciate_obj(ext)
 
-      list_objects = _objects(json_obj)
-      if list_objects is not None:
-        for name, tmp_obj in list_objects.items():
-          obj.objects[name] = Object.new(tmp_obj, library)
-
-      relations = _relations(json_obj)
-      if relations is not None:
-        for name, rlt in relations.items():
-          obj.relations[name] = Relation.new(rlt)
+    list_objects = _objects(json_obj)
+    if list_objects:
+      for name, tmp_obj in list_objects.items():
+        if not isinstance(tmp_obj, Object):
+          tmp_obj = Object.new(tmp_obj, library)
+        obj._attach_object(name, tmp_obj)
+
+    relations = _relations(json_obj)
+    if relations:
+      obj._relations = {}
+      for name, rlt in relations.items():
+        if isinstance(rlt, Relation):
+          relation = rlt
+        else:
+          relation = Relation.new(rlt, library)
+        relation.parent = obj
+        relation._name = name = sys.intern(name)
+        relation._resolve_endpoints()
+        obj._relations[name] = relation
 
     properties = _properties(json_obj)
-    if properties is not None:
-      obj.properties.update(properties)
+    if properties:
+      obj._properties = {sys.intern(key): value
+                         for key, value in properties.items()}
 
+    # A loaded object is not dirty
+    obj._dirty = None
     return obj
 
   #TODO: look at the difference between __str__ and __repr__
@@ -132,12 +692,24 @@ class Object:
     if (value == "") | ( value is not None and not isinstance(value, str) ):
       raise TypeError("The value must be a non empty string or None.")
     self.extends = value
+    self._modified("extends")
 
   def get_extends(self):
     """get_extends()
     Get the value of the `extends` field."""
     return self.extends
 
+  def lazy_copy(self):
+    """lazy_copy()
+    Return a copy of the object that shares the definition of the current
+    object instead of copying it.
+
+    The sub-objects and the relations of a node of the copy are only created
+    when they are accessed, and its properties when they are modified (or
+    accessed through the `properties` attribute). Hence the current object
+    must not be modified while its lazy copies are in use."""
+    return _ObjectInstance(self)
+
   @typecheck
   def add_object(self, name: str, obj):
     """add_object(name, obj)
@@ -149,16 +721,126 @@ class Object:
       raise TypeError(_function_name() + " first argument must be a non empty string")
     if not isinstance(obj, Object):
       raise TypeError(_function_name() + " second argument must be an Object")
-    self.objects[name] = obj
+    self._attach_object(name, obj)
     
+  def bulk_add(self, objects=None, properties=None, relations=None):
+    """bulk_add(objects=None, properties=None, relations=None)
+    Add at once the sub-objects, the properties and the relations given by
+    the dictionaries `objects` (name => Object), `properties`
+    (key => value) and `relations` (name => Relation).
+
+    All the arguments are checked as done by :meth:`add_object`,
+    :meth:`add_property` and :meth:`add_relation` before anything is added,
+    so that nothing is added if one of them is not valid. The indexes are
+    updated once. Then the objects linked by the relations, given by the
+    names of their fromSet and toSet, are looked up in a single pass, and
+    the names which have not been found are reported once.
+
+    See also :meth:`batch`."""
+    self._bulk_add(objects, properties, relations)
+
+  def _bulk_add(self, objects=None, properties=None, relations=None, endpoints=None):
+    """_bulk_add(objects=None, properties=None, relations=None, endpoints=None)
+    Same as :meth:`bulk_add`. `endpoints` maps the names of some relations to
+    the pairs (from_names, to_names) added to their fromSet and toSet once
+    all the arguments have been checked."""
+    objects = dict(objects or {})
+    properties = dict(properties or {})
+    relations = dict(relations or {})
+    if (objects or relations) and self.extends is not None:
+      raise TypeError("Illegal call of " + _function_name() + " on an objects extending " + str(self.extends))
+    for name, obj in objects.items():
+      if not isinstance(name, str) or name == "":
+        raise TypeError(_function_name() + " the names of the objects must be non empty strings")
+      if not isinstance(obj, Object):
+        raise TypeError(_function_name() + " the objects must be Objects")
+    for key, value in properties.items():
+      if not isinstance(key, str) or key == "":
+        raise TypeError(_function_name() + " the keys of the properties must be non empty strings")
+      if not isinstance(value, str):
+        raise TypeError(_function_name() + " the values of the properties must be strings")
+      if key in self.properties:
+        raise Exception("The key ", key, " already exist. Remove it first to modify its value.")
+    for name, relation in relations.items():
+      if not isinstance(name, str) or name == "":
+        raise TypeError(_function_name() + " the names of the relations must be non empty strings")
+      if not isinstance(relation, Relation):
+        raise TypeError(_function_name() + " the relations must be Relations")
+    links = {}
+    for name, (from_names, to_names) in (endpoints or {}).items():
+      from_names, to_names = list(from_names), list(to_names)
+      if not all(isinstance(n, str) for n in from_names + to_names):
+        raise TypeError(_function_name() + " the names of the linked objects must be strings")
+      links[name] = (from_names, to_names)
+
+    for name, (from_names, to_names) in links.items():
+      relation = relations[name]
+      relation.fromSet.update(dict.fromkeys(map(sys.intern, from_names)))
+      relation.toSet.update(dict.fromkeys(map(sys.intern, to_names)))
+    if objects:
+      self._attach_objects(objects)
+    if properties:
+      for key, value in properties.items():
+        self._set_property(key, value)
+    for name, relation in relations.items():
+      self._attach_relation(name, relation)
+
+    missing = set()
+    for relation in relations.values():
+      relation._resolve_endpoints()
+      for endpoints in (relation.fromSet, relation.toSet):
+        missing.update(name for name, obj in endpoints.items() if obj is None)
+    if missing:
+      print("The objects named", ", ".join(sorted(missing)), "have not been "
+            "found. Added nevertheless")
+
+  def batch(self):
+    """batch()
+    Return a context manager collecting additions, which are applied by
+    :meth:`bulk_add` when the `with` block ends without error::
+
+      >>> with car.batch() as batch:
+      ...   batch.add_object("wheel", wheel)
+      ...   batch.add_property("color", "red")
+      ...   batch.add_relation("holds", Relation(), ["frame"], ["wheel"])
+
+    The additions are only checked when they are applied."""
+    return _Batch(self)
+
   @typecheck
-  def remove_object(self, name: str):
-    """remove_object(name)
+  def remove_object(self, name: str, remove_relations=False):
+    """remove_object(name, remove_relations=False)
     Remove the object named `name`.
+
+    If `remove_relations` is True, the relations made unvalid by the removal
+    (i.e. the relations of the current object and of its ancestors linking
+    an object of the removed sub-hierarchy that does not exist anymore) are
+    also removed. Only the relations linking the removed objects are looked
+    at.
     
     Please see tutorial for an extended example that incorporates the use of this function.
     """
-    del self.objects[name]
+    obj = self._detach_object(name)
+    if not remove_relations:
+      return
+
+    names = {name}
+    names.update(obj_name for parent, obj_name, sub_obj in obj._iter_entries())
+    visited = set()
+    stack = [self]
+    while stack:
+      ancestor = stack.pop()
+      if id(ancestor) in visited:
+        continue
+      visited.add(id(ancestor))
+      stack.extend(ancestor._parents or ())
+      endpoints = ancestor._get_endpoints()
+      for obj_name in names:
+        if obj_name not in endpoints or obj_name in ancestor.objects or \
+           obj_name in ancestor._get_index():
+          continue
+        for rlt_name in list(endpoints[obj_name]):
+          ancestor.remove_relation(rlt_name)
 
   @typecheck
   def add_relation(self, name: str, relation):
@@ -167,16 +849,43 @@ class Object:
       raise TypeError("Impossible to add a relation to an object that extends an other")
     if name == "":
       raise TypeError(_function_name() + " first argument must be a non empty string")
-    self.relations[name] = relation
+    self._attach_relation(name, relation)
+
+  def _attach_relation(self, name, relation):
+    """Put `relation` under the name `name` and update the reverse index."""
+    name = sys.intern(name)
+    if self._relations is None:
+      self._relations = {}
+    elif name in self._relations:
+      # The relation is replaced in place, in order to keep the order of the
+      # relations
+      self._release_relation(name, self._relations[name])
+    dict.__setitem__(self._relations, name, relation)
     relation.parent = self
+    relation._name = name
+    if self._endpoints is not None:
+      self._endpoints_update(name, relation, True)
+    self._modified("relations", name)
 
   @typecheck
   def remove_relation(self, name: str):
     """remove_relation(name)
     Remove the relation named `name`."""
     if name in self.relations:
-      self.relations[name].parent = None
-      del self.relations[name]
+      self._detach_relation(name)
+
+  def _detach_relation(self, name):
+    """Remove the relation named `name` and update the reverse index."""
+    self._release_relation(name, dict.pop(self._relations, name))
+
+  def _release_relation(self, name, rlt):
+    """Update the reverse index and the relation `rlt`, which is no more the
+    relation named `name` of the current object."""
+    if self._endpoints is not None:
+      self._endpoints_update(name, rlt, False)
+    rlt.parent = None
+    rlt._name = None
+    self._modified("relations", name)
 
   @typecheck
   def add_property(self, key: str, value: str):
@@ -193,7 +902,7 @@ class Object:
 
     if key in self.properties:
       raise Exception("The key ", key, " already exist. Remove it first to modify its value.")
-    self.properties[key] = value
+    self._set_property(key, value)
   
   @typecheck
   def remove_property(self, key: str):
@@ -204,7 +913,21 @@ class Object:
     `"""
     if key == "":
       raise TypeError(_function_name() + " first argument must be a non empty string")
-    del self.properties[key]
+    if key not in self.properties:
+      raise KeyError(key)
+    self._del_property(key)
+
+  @typecheck
+  def find_by_property(self, key: str, value: str):
+    """find_by_property(key, value)
+    Return the list of the objects of the sub-hierarchy having the
+    `key` => `value` property.
+
+    The first call builds an index of the properties of the sub-hierarchy.
+    It is then maintained by :meth:`add_property`, :meth:`remove_property`,
+    :meth:`add_object` and :meth:`remove_object`, so that the next calls take
+    a time proportional to the number of objects found."""
+    return _index_values(self._get_property_index().get((key, value)))
 
   @typecheck
   def lookup_obj_parent(self, name: str):
@@ -212,18 +935,39 @@ class Object:
     Return the parent of the object named `name`. None if not found.
 
     In case of multiple objects with the same name, it returns one parent.
+    Use :meth:`lookup_obj_parents` to get all of them.
     
     Please see tutorial for an extended example that incorporates the use of this function.
     """
     if name in self.objects:
       return self
+    return self._first_parent(name)
+
+  def _first_parent(self, name):
+    """Return the first parent of an object named `name` found by a depth
+    first search of the sub-hierarchy, the parents being visited in
+    preorder. None if not found.
+
+    The index gives it directly when all the objects named `name` have the
+    same parent. Otherwise, the sub-hierarchy is searched until one of them
+    is found."""
+    entry = self._get_index().get(name)
+    if entry is None:
+      return None
+    if not isinstance(entry, dict):
+      return entry
+    if len(entry) == 1:
+      return next(iter(entry.values()))[0]
+    for parent, sub_name, obj in self._iter_entries():
+      if sub_name == name:
+        return parent
 
-    for key, obj in self.objects.items():
-      if len(obj.objects) > 0:
-        res = obj.lookup_obj_parent(name)
-        if res is not None:
-          return res
-    return None
+  @typecheck
+  def lookup_obj_parents(self, name: str):
+    """lookup_obj_parents(name)
+    Return the list of the parents of all the objects named `name` in the
+    sub-hierarchy. The list is empty if none is found."""
+    return _index_values(self._get_index().get(name))
 
   @typecheck
   def lookup_obj(self, name: str):
@@ -234,11 +978,55 @@ class Object:
     
     Please see tutorial for an extended example that incorporates the use of this function.
     """
-    parent = self.lookup_obj_parent(name)
+    return self._lookup_obj(name)
+
+  def _lookup_obj(self, name):
+    """Same as lookup_obj, without checking the type of `name`."""
+    if name in self.objects:
+      return self.objects[name]
+    parent = self._first_parent(name)
     if parent is None:
       return None
-    else:
-      return parent.objects[name]
+    return parent.objects[name]
+
+  @typecheck
+  def lookup_objs(self, name: str):
+    """lookup_objs(name)
+    Return the list of all the objects named `name` in the sub-hierarchy. The
+    list is empty if none is found."""
+    return [parent.objects[name] for parent in self.lookup_obj_parents(name)]
+
+  @typecheck
+  def lookup_relations(self, name: str):
+    """lookup_relations(name)
+    Return the list of the relations of the hierarchy (including the ones of
+    the current object) that link an object named `name`.
+
+    Only the ancestors of the objects named `name` are looked at, using their
+    reverse index of relations."""
+    # A relation can only link the objects of the sub-hierarchy of the object
+    # containing it. We look at the ancestors of the parents of the objects
+    # named `name` that are in the current hierarchy.
+    in_hierarchy = {id(self): True}
+    def _in_hierarchy(obj):
+      if id(obj) not in in_hierarchy:
+        in_hierarchy[id(obj)] = False
+        in_hierarchy[id(obj)] = any(_in_hierarchy(parent)
+                                    for parent in obj._parents or ())
+      return in_hierarchy[id(obj)]
+
+    result = []
+    visited = set()
+    stack = list(self.lookup_obj_parents(name))
+    while stack:
+      obj = stack.pop()
+      if id(obj) in visited or not _in_hierarchy(obj):
+        continue
+      visited.add(id(obj))
+      result.extend(obj._get_endpoints().get(name, {}).values())
+      if obj is not self:
+        stack.extend(obj._parents or ())
+    return result
   
   def remove_unvalid_relations(self):
     """Remove the relations that contains in the fromSet or toSet field some
@@ -249,7 +1037,7 @@ class Object:
       """Returns the set containing all the names of the objects defined in the
       hierarchy, and remove the unvalid relations directly contained by object."""
       all_objects = set()
-      for name, obj in object.objects.items():
+      for name, obj in (object._objects or {}).items():
         all_objects.update(_recursive_function(obj))
         all_objects.add(name)
 
@@ -276,7 +1064,7 @@ class Object:
       return all_objects
     _recursive_function(self)
 
-  def keyword_abstraction(self, key: str, value: str):
+  def keyword_abstraction(self, key: str, value: str, view=False):
     """Return an abstraction of the current object keeping only objects
     having the `key` => `value` property. It does not modify the current 
     object. The root object is never deleted.
@@ -287,53 +1075,103 @@ class Object:
     object must have the `key` => `value` property.
 
     The relations made unvalid because of the removal of some objects
-    are automatically deleted."""
-    abstraction = deepcopy(self)
-
-    def _recursive_deletion(object):
-      copy = dict(object.objects)
-      for name, obj in copy.items():
-        if key not in obj.properties:
-          object.remove_object(name)
-        else:
-          if obj.properties[key] != value:
-            object.remove_object(name)
-      # Recursive call
-      for name, obj in object.objects.items():
-        _recursive_deletion(obj)
+    are automatically deleted.
+
+    If `view` is True, a read-only :class:`ObjectView` sharing the current
+    object is returned instead of a copy.
 
-    _recursive_deletion(abstraction)
-    abstraction.remove_unvalid_relations()
-    return abstraction
+    If the property index has been built by :meth:`find_by_property`, the
+    objects to keep are found in the index instead of reading their
+    properties."""
+    select = functools.partial(_has_property, key, value)
+    if view:
+      return ObjectView(self, select)
+    if self._property_index is not None:
+      hits = {id(obj) for obj in
+              _index_values(self._property_index.get((key, value)))}
+      return self._abstraction(lambda depth, name, obj: id(obj) in hits)
+
+    return self._abstraction(select)
 
   @typecheck
-  def abst_obj(self, level: int):
-    """abst_obj(level)
+  def abst_obj(self, level: int, view=False):
+    """abst_obj(level, view=False)
     Return the object that only includes the depth of levels specified.
     
-    Using deepcopy, we make a copy of the function, so that the object
-    calling the abstraction function is not itself modified.
+    The abstraction is built in a single traversal, copying only the objects
+    that are kept, so that the object calling the abstraction function is not
+    itself modified.
+    If `view` is True, a read-only :class:`ObjectView` sharing the current
+    object is returned instead of a copy.
     
     This does not yet account for additional properties from extended objects.
     
     Please see tutorial for an extended example that incorporates the use of this function.
 
     The relations made unvalid because of the removal of some objects
-    are automatically deleted."""
-    abst = deepcopy(self)
-    
-    if level <= 0:
-      abst.objects = {}
-      return abst
-    
-    for name, obj in abst.objects.items():
-      abst.objects[name] = obj.abst_obj(level-1)
-    abst.remove_unvalid_relations()
-    return abst
+    are automatically deleted (except for level 0, which keeps the relations
+    of the object)."""
+    select = functools.partial(_above_depth, level)
+    if view:
+      return ObjectView(self, select, check_relations=level > 0)
+
+    return self._abstraction(select, check_relations=level > 0)
+
+  def _abstraction(self, select, check_relations=True, properties=None):
+    """Return a copy of the current object keeping only the sub-objects chosen
+    by `select(depth, name, obj)` (see :class:`ObjectView`). If given,
+    `properties(depth, obj)` returns the properties of the copy of `obj`, or
+    None to copy the ones of `obj`.
+
+    The kept objects are copied in a single traversal. Then a single pass,
+    from the leaves to the root, copies the relations. If `check_relations`
+    is True, the relations linking objects that are not in the sub-hierarchy
+    of their parent are dropped, as done by remove_unvalid_relations."""
+    root = Object()
+    # Pairs (original, copy) in an order where parents precede their children
+    nodes = []
+    memo = {}
+    stack = [(self, root, 0)]
+    while stack:
+      src, dst, depth = stack.pop()
+      nodes.append((src, dst))
+      memo[id(src)] = dst
+      dst.extends = src.extends
+      props = None
+      if properties is not None:
+        props = properties(depth, src)
+      if props is None:
+        props = src._properties
+      if props:
+        dst._properties = dict(props)
+      for name, obj in (src._objects or {}).items():
+        if select(depth, name, obj):
+          child = Object()
+          dst._attach_object(name, child)
+          stack.append((obj, child, depth + 1))
+
+    # Names of the objects in the sub-hierarchy of each copy
+    names = {}
+    for src, dst in reversed(nodes):
+      if check_relations:
+        all_names = set()
+        for name, child in (dst._objects or {}).items():
+          all_names.add(name)
+          all_names.update(names.pop(id(child)))
+        names[id(dst)] = all_names
+      for name, rlt in (src._relations or {}).items():
+        if check_relations and \
+           not (all(obj_name in all_names for obj_name in rlt.fromSet) and
+                all(obj_name in all_names for obj_name in rlt.toSet)):
+          continue
+        if dst._relations is None:
+          dst._relations = {}
+        dst._relations[name] = rlt._copy(dst, memo)
+    return root
 
   @typecheck
-  def abst_obj_prop(self, level: int):
-    """abst_obj_prop(level)
+  def abst_obj_prop(self, level: int, view=False):
+    """abst_obj_prop(level, view=False)
     Return the object that only includes the depth of levels specified.
     
     The properties of the objects that are beyond the specified level
@@ -343,32 +1181,22 @@ class Object:
       
     Using deepcopy, we make a copy of the function, so that the object
     calling the abstraction function is not itself modified.
+    If `view` is True, a read-only :class:`ObjectView` is returned instead:
+    only the properties of the objects at the specified level are copied.
     
     This does not yet account for additional properties from extended objects.
     
     Please see tutorial for an extended example that incorporates the use of this function.
     """
+    cut = max(level, 0)
+    select = functools.partial(_above_depth, cut)
+    properties = functools.partial(_flat_at_depth, cut)
+    if view:
+      return ObjectView(self, select, properties,
+                        check_relations=len(self.objects) > 0)
     
-    abst = deepcopy(self)
-    
-    if len(abst.objects) == 0:
-      return abst
-    
-    if level <= 0:
-      for name, obj in abst.objects.items():
-        res = obj.abst_obj_prop(level-1)
-        abst.properties[name] = None
-                
-        for key, prop in res.properties.items():
-          abst.properties[name + '_' + key] = prop
-      abst.objects = {}
-    
-    if level > 0:
-      for name, obj in abst.objects.items():
-        abst.objects[name] = obj.abst_obj_prop(level-1)
-    
-    abst.remove_unvalid_relations()
-    return abst
+    return self._abstraction(select, check_relations=len(self.objects) > 0,
+                             properties=properties)
   
   def flatten(self):
     """flatten()
@@ -380,6 +1208,40 @@ class Object:
     Please see tutorial for an extended example that incorporates the use of this function.
     """
     return self.abst_obj_prop(0)
+
+  def iter_flat(self, sep=None):
+    """iter_flat(sep=None)
+    Generate lazily the (path, value) pairs of the flattened object, in the
+    order of the properties of :meth:`flatten`.
+
+    `path` is a tuple of names. For a property, it ends with the key of the
+    property and `value` is the value of the property. For an object, it ends
+    with the name of the object and `value` is None.
+
+    If `sep` is given, `path` is the string made of the names joined by `sep`.
+    Using '_' gives the keys of the properties of :meth:`flatten`.
+
+    The object is traversed once and only the path to the current object is
+    kept in memory."""
+    def _path(path):
+      return path if sep is None else sep.join(path)
+
+    for key, value in (self._properties or {}).items():
+      yield _path((key,)), value
+    stack = [((), iter((self._objects or {}).items()))]
+    while stack:
+      prefix, children = stack[-1]
+      for name, obj in children:
+        path = prefix + (name,)
+        yield _path(path), None
+        if obj._properties:
+          for key, value in obj._properties.items():
+            yield _path(path + (key,)), value
+        if obj._objects:
+          stack.append((path, iter(obj._objects.items())))
+        break
+      else:
+        stack.pop()
   
   def flatten_with_extends(self, library):
     """flatten_with_extends(library)    
@@ -387,38 +1249,36 @@ class Object:
     
     Please see tutorial for an extended example that incorporates the use of this function.
     """
-    abst = deepcopy(self)
-    level = 0
-    
-    
+    abst = Object()
+    abst.extends = self.extends
+    properties = dict(self._properties or {})
     if self.extends != None:
-      temp = library.instanciate_obj(self.extends)
+      temp = library.instanciate_obj(self.extends, shared=True)
       temp = temp.flatten_with_extends(library)
-      abst.properties = dict(list(abst.properties.items()) + list(temp.properties.items()))
-      
-    if len(abst.objects) == 0:
-      return abst
-    
-    if level <= 0:
-      for name, obj in abst.objects.items():
-        
-        if obj.extends != None:
-          temp = library.instanciate_obj(obj.extends)
-          temp = temp.flatten_with_extends(library)
-          obj.properties = dict(list(obj.properties.items()) + list(temp.properties.items()))
-      
-        res = obj.abst_obj_prop(level-1)
-        abst.properties[name] = None
-                
-        for key, prop in res.properties.items():
-          abst.properties[name + '_' + key] = prop
-      abst.objects = {}
-    
-    if level > 0:
-      for name, obj in abst.objects.items():
-        abst.objects[name] = obj.abst_obj_prop(level-1)
-    
-    abst.remove_unvalid_relations()
+      properties.update(temp._properties or {})
+
+    # The sub-objects are flattened into the properties. The ones extending a
+    # class are flattened from lazy copies holding the properties of the class
+    for name, obj in (self._objects or {}).items():
+      if obj.extends != None:
+        temp = library.instanciate_obj(obj.extends, shared=True)
+        temp = temp.flatten_with_extends(library)
+        obj_properties = dict(obj._properties or {})
+        obj_properties.update(temp._properties or {})
+        obj = obj.lazy_copy()
+        obj._properties = obj_properties
+      properties[name] = None
+      for key, prop in _flat_properties(obj).items():
+        properties[name + '_' + key] = prop
+    if properties:
+      abst._properties = properties
+
+    # Without the sub-objects, only the relations linking no object are valid
+    for name, rlt in (self._relations or {}).items():
+      if not self._objects or not (rlt.fromSet or rlt.toSet):
+        if abst._relations is None:
+          abst._relations = {}
+        abst._relations[name] = rlt._copy(abst, {})
     return abst
   
   def compare(self, obj):
@@ -427,37 +1287,11 @@ class Object:
     of the two objects that are being compared
     
     This does not yet account for additional properties from extended objects.
+    Use :func:`diff` to get the differences as a structured result.
     
     Please see tutorial for an extended example that incorporates the use of this function.
     """
-    abst1, abst2 = self.flatten(), obj.flatten()
-    set1, set2 = set(abst1.properties.keys()), set(abst2.properties.keys())
-    intersect = set1.intersection(set2)
-    
-    only2 = set2 - intersect
-    only1 = set1 - intersect
-    
-    print ("\n" + "Items only in obj: ")
-    for e in only2:
-      for key, val in abst2.properties.items():
-        if key == e and abst2.properties[key] != None:
-          print("[Property] " + key + " = " + val)
-        if key == e and abst2.properties[key] == None:
-          print("[Object] " + key)
-    
-    print ("\n" + "Items only in self: ")
-    for e in only1:
-      for key, val in abst1.properties.items():
-        if key == e and abst1.properties[key] != None:
-          print("[Property] " + key + " = " + val)
-        if key == e and abst1.properties[key] == None:
-          print("[Object] " + key) 
-          
-    print ("\n" + "Items with differing values: ")
-    for e in intersect:
-      for key, val in abst1.properties.items():
-        if key == e and abst1.properties[key] != abst2.properties[key]:
-          print("[Property] " + key + " = " + val)
+    _print_diff(diff(self, obj))
           
   def compare_with_extends(self, obj, library):
     """compare_with_extends(obj)
@@ -468,76 +1302,637 @@ class Object:
     
     Please see tutorial for an extended example that incorporates the use of this function.
     """
-    abst1, abst2 = self.flatten_with_extends(library), obj.flatten_with_extends(library)
-    set1, set2 = set(abst1.properties.keys()), set(abst2.properties.keys())
-    intersect = set1.intersection(set2)
-    
-    only2 = set2 - intersect
-    only1 = set1 - intersect
-    
-    print ("\n" + "Items only in obj: ")
-    for e in only2:
-      for key, val in abst2.properties.items():
-        if key == e and abst2.properties[key] != None:
-          print("[Property] " + key + " = " + val)
-        if key == e and abst2.properties[key] == None:
-          print("[Object] " + key)
-    
-    print ("\n" + "Items only in self: ")
-    for e in only1:
-      for key, val in abst1.properties.items():
-        if key == e and abst1.properties[key] != None:
-          print("[Property] " + key + " = " + val)
-        if key == e and abst1.properties[key] == None:
-          print("[Object] " + key) 
-          
-    print ("\n" + "Items with differing values: ")
-    for e in intersect:
-      for key, val in abst1.properties.items():
-        if key == e and abst1.properties[key] != abst2.properties[key]:
-          print("[Property] " + key + " = " + val)
+    _print_diff(diff(self.flatten_with_extends(library),
+                     obj.flatten_with_extends(library)))
+
+Diff = collections.namedtuple("Diff", ["only_left", "only_right", "changed"])
+Diff.__doc__ = """Differences between two flattened objects.
+
+`only_left` and `only_right` map the paths existing in only one of the objects
+to their value. `changed` maps the paths existing in both objects with
+different values to the pair (left value, right value). As for
+:meth:`Object.iter_flat`, a path is a tuple of names and the value of an
+object is None."""
+
+def iter_diff(left, right):
+  """iter_diff(left, right)
+  Generate the differences between the flattened objects `left` and `right`
+  as (kind, path, left_value, right_value) tuples. `kind` is "left" or
+  "right" for the paths existing only in `left` or `right`, and "changed"
+  for the paths having different values.
+
+  Both objects are traversed together and the sub-hierarchies having the same
+  :meth:`~Object.fingerprint` are skipped."""
+  stack = [((), left, right)]
+  while stack:
+    prefix, left, right = stack.pop()
+    if left.fingerprint() == right.fingerprint():
+      continue
+
+    for key, value in left.properties.items():
+      if key in right.properties:
+        other = right.properties[key]
+        if other != value:
+          yield "changed", prefix + (key,), value, other
+      else:
+        yield "left", prefix + (key,), value, None
+    for key, value in right.properties.items():
+      if key not in left.properties:
+        yield "right", prefix + (key,), None, value
+
+    left_objects = left.objects
+    right_objects = right.objects
+    for name, obj in left_objects.items():
+      path = prefix + (name,)
+      if name in right_objects:
+        stack.append((path, obj, right_objects[name]))
+      else:
+        yield "left", path, None, None
+        for sub_path, value in obj.iter_flat():
+          yield "left", path + sub_path, value, None
+    for name, obj in right_objects.items():
+      if name not in left_objects:
+        path = prefix + (name,)
+        yield "right", path, None, None
+        for sub_path, value in obj.iter_flat():
+          yield "right", path + sub_path, None, value
+
+def diff(left, right):
+  """diff(left, right)
+  Return the :class:`Diff` between the flattened objects `left` and `right`.
+
+  It is computed in a time linear in the size of the objects."""
+  result = Diff({}, {}, {})
+  for kind, path, left_value, right_value in iter_diff(left, right):
+    if kind == "left":
+      result.only_left[path] = left_value
+    elif kind == "right":
+      result.only_right[path] = right_value
+    else:
+      result.changed[path] = (left_value, right_value)
+  return result
+
+def _print_diff(result):
+  """Print a Diff as done by Object.compare, `self` being the left object."""
+  def _print_item(path, value):
+    key = '_'.join(path)
+    if value is None:
+      print("[Object] " + key)
+    else:
+      print("[Property] " + key + " = " + value)
+
+  print ("\n" + "Items only in obj: ")
+  for path, value in result.only_right.items():
+    _print_item(path, value)
+
+  print ("\n" + "Items only in self: ")
+  for path, value in result.only_left.items():
+    _print_item(path, value)
+
+  print ("\n" + "Items with differing values: ")
+  for path, (value, other) in result.changed.items():
+    print("[Property] " + '_'.join(path) + " = " + str(value))
+
+class _Batch:
+  """Additions collected by :meth:`Object.batch`, applied at once to `obj` by
+  :meth:`Object.bulk_add` at the end of the `with` block. The relations are
+  left untouched until then: the names of the objects they link are kept in
+  `endpoints`."""
+  __slots__ = ("obj", "objects", "properties", "relations", "endpoints")
+
+  def __init__(self, obj):
+    self.obj = obj
+    self.objects = {}
+    self.properties = {}
+    self.relations = {}
+    self.endpoints = {}
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if exc_type is None:
+      self.obj._bulk_add(self.objects, self.properties, self.relations, self.endpoints)
+    return False
+
+  def add_object(self, name, obj):
+    """add_object(name, obj)
+    Add the object `obj` with the name `name`."""
+    self.objects[name] = obj
+
+  def add_property(self, key, value):
+    """add_property(key, value)
+    Add the property `key` => `value`."""
+    if key in self.properties:
+      raise Exception("The key ", key, " already exist. Remove it first to modify its value.")
+    self.properties[key] = value
+
+  def add_relation(self, name, relation, from_names=(), to_names=()):
+    """add_relation(name, relation, from_names=(), to_names=())
+    Add the relation `relation` with the name `name`, linking the objects
+    named in `from_names` to the ones named in `to_names`. They are looked up
+    when the additions are applied, and the relation is not modified before."""
+    self.relations[name] = relation
+    self.endpoints[name] = (tuple(from_names), tuple(to_names))
+
+# Marks a container of an _ObjectInstance that is still the one of its template
+_INHERITED = object()
+
+_OBJECTS_SLOT = Object._objects
+_RELATIONS_SLOT = Object._relations
+_PROPERTIES_SLOT = Object._properties
+
+class _ObjectInstance(Object):
+  """Object sharing the definition of an other object (its `_template`), as
+  returned by :meth:`Object.lazy_copy`.
+
+  Its containers are _INHERITED until they are needed. The sub-objects are
+  then themselves _ObjectInstance of the sub-objects of the template, and the
+  relations are copies of the ones of the template linking them. The
+  properties of the template are used as long as they are not modified.
+
+  A copy of an _ObjectInstance is a plain Object."""
+  __slots__ = ("_template",)
+
+  def __init__(self, template):
+    Object.__init__(self)
+    self._template = template
+    self.extends = template.extends
+    _OBJECTS_SLOT.__set__(self, _INHERITED)
+    _RELATIONS_SLOT.__set__(self, _INHERITED)
+    _PROPERTIES_SLOT.__set__(self, _INHERITED)
+
+  def __reduce_ex__(self, protocol):
+    return (Object, (), self.__getstate__())
+
+  def _get_objects(self):
+    objects = _OBJECTS_SLOT.__get__(self)
+    if objects is _INHERITED:
+      objects = None
+      if self._template._objects:
+        objects = {}
+        for name, template in self._template._objects.items():
+          obj = _ObjectInstance(template)
+          obj._parents = [self]
+          if not isinstance(self._dirty, bool):
+            obj._dirty = None
+          objects[name] = obj
+      _OBJECTS_SLOT.__set__(self, objects)
+    return objects
+
+  def _get_relations(self):
+    relations = _RELATIONS_SLOT.__get__(self)
+    if relations is _INHERITED:
+      relations = None
+      if self._template._relations:
+        targets = set()
+        for rlt in self._template._relations.values():
+          targets.update(id(obj) for obj in rlt.fromSet.values())
+          targets.update(id(obj) for obj in rlt.toSet.values())
+        memo = self._instances_of(targets)
+        relations = {name: rlt._copy(self, memo)
+                     for name, rlt in self._template._relations.items()}
+      _RELATIONS_SLOT.__set__(self, relations)
+    return relations
+
+  def _get_properties(self):
+    properties = _PROPERTIES_SLOT.__get__(self)
+    if properties is _INHERITED:
+      return self._template._properties
+    return properties
+
+  _objects = property(_get_objects, _OBJECTS_SLOT.__set__)
+  _relations = property(_get_relations, _RELATIONS_SLOT.__set__)
+  _properties = property(_get_properties, _PROPERTIES_SLOT.__set__)
+
+  def _get_public_properties(self):
+    if _PROPERTIES_SLOT.__get__(self) is _INHERITED:
+      if self._template._properties:
+        # The properties may be modified through the attribute
+        self._own_properties()
+      else:
+        _PROPERTIES_SLOT.__set__(self, None)
+    return Object.properties.fget(self)
+
+  properties = property(_get_public_properties, Object.properties.fset,
+                        doc=Object.properties.__doc__)
+
+  def _own_properties(self):
+    properties = _PROPERTIES_SLOT.__get__(self)
+    if properties is _INHERITED:
+      properties = dict(self._template._properties or {})
+      _PROPERTIES_SLOT.__set__(self, properties)
+    elif properties is None:
+      properties = {}
+      _PROPERTIES_SLOT.__set__(self, properties)
+    return properties
+
+  def _instances_of(self, targets):
+    """Return the {id(object of the template): instance} dictionary of the
+    objects of the template whose ids are in `targets`. Only the instances
+    on the paths leading to them are created."""
+    memo = {}
+    remaining = set(targets)
+    queue = collections.deque([(self._template, self)])
+    while queue and remaining:
+      template, obj = queue.popleft()
+      if id(template) in remaining:
+        memo[id(template)] = obj
+        remaining.discard(id(template))
+      if not template._objects:
+        continue
+      objects = obj._objects or {}
+      for name, sub_template in template._objects.items():
+        sub_obj = objects.get(name)
+        if isinstance(sub_obj, _ObjectInstance) and \
+           sub_obj._template is sub_template:
+          queue.append((sub_template, sub_obj))
+    return memo
+
+# Marks a container of a _LazyObject which has not been built yet
+_UNBUILT = object()
+
+class _LazyObject(Object):
+  """Object whose containers are built from a description of the object when
+  they are first accessed.
+
+  The subclasses define `_build_objects`, `_build_relations` and
+  `_build_properties`, which return the containers (None if empty). The
+  objects linked by the relations are then looked up in the sub-hierarchy,
+  which builds it entirely. `_container_built` is called after each container
+  has been built.
+
+  A copy of a _LazyObject is a plain Object."""
+  __slots__ = ()
+
+  def __init__(self):
+    Object.__init__(self)
+    # The lazy objects are loaded objects
+    self._dirty = None
+    _OBJECTS_SLOT.__set__(self, _UNBUILT)
+    _RELATIONS_SLOT.__set__(self, _UNBUILT)
+    _PROPERTIES_SLOT.__set__(self, _UNBUILT)
+
+  def __reduce_ex__(self, protocol):
+    return (Object, (), self.__getstate__())
+
+  def _unbuilt(self):
+    """Tell if one of the containers has not been built yet."""
+    return _UNBUILT in (_OBJECTS_SLOT.__get__(self),
+                        _RELATIONS_SLOT.__get__(self),
+                        _PROPERTIES_SLOT.__get__(self))
+
+  def _container_built(self):
+    pass
+
+  def _get_objects(self):
+    objects = _OBJECTS_SLOT.__get__(self)
+    if objects is _UNBUILT:
+      objects = self._build_objects()
+      for obj in (objects or {}).values():
+        obj._parents = [self]
+      _OBJECTS_SLOT.__set__(self, objects)
+      self._container_built()
+    return objects
+
+  def _get_relations(self):
+    relations = _RELATIONS_SLOT.__get__(self)
+    if relations is _UNBUILT:
+      relations = self._build_relations()
+      _RELATIONS_SLOT.__set__(self, relations)
+      self._container_built()
+      for name, rlt in (relations or {}).items():
+        rlt.parent = self
+        rlt._name = name
+        rlt._resolve_endpoints()
+    return relations
+
+  def _get_properties(self):
+    properties = _PROPERTIES_SLOT.__get__(self)
+    if properties is _UNBUILT:
+      properties = self._build_properties()
+      _PROPERTIES_SLOT.__set__(self, properties)
+      self._container_built()
+    return properties
+
+  _objects = property(_get_objects, _OBJECTS_SLOT.__set__)
+  _relations = property(_get_relations, _RELATIONS_SLOT.__set__)
+  _properties = property(_get_properties, _PROPERTIES_SLOT.__set__)
+
+class _JsonObject(_LazyObject):
+  """Object built lazily from its json description `_json`, as returned by
+  :meth:`Object.new` with `lazy` = True. The sub-objects are themselves
+  _JsonObject. The json description is released once all the containers
+  have been built."""
+  __slots__ = ("_json", "_library")
+
+  def __init__(self, json_obj, library):
+    _LazyObject.__init__(self)
+    self._json = json_obj
+    self._library = library
+    self.extends = _extends(json_obj)
+
+  def _container_built(self):
+    if not self._unbuilt():
+      self._json = None
+      self._library = None
+
+  def _build_objects(self):
+    list_objects = _objects(self._json)
+    if not list_objects:
+      return None
+    return {sys.intern(name): obj if isinstance(obj, Object)
+                              else _JsonObject(obj, self._library)
+            for name, obj in list_objects.items()}
+
+  def _build_relations(self):
+    relations = _relations(self._json)
+    if not relations:
+      return None
+    return {sys.intern(name): rlt if isinstance(rlt, Relation)
+                              else Relation.new(rlt, self._library)
+            for name, rlt in relations.items()}
+
+  def _build_properties(self):
+    properties = _properties(self._json)
+    if not properties:
+      return None
+    return {sys.intern(key): value for key, value in properties.items()}
+
+def _flat_properties(obj):
+  """Return the properties of `obj` followed by the ones of its sub-hierarchy,
+  labelled with their path, as done by Object.abst_obj_prop(0)."""
+  return dict(obj.iter_flat('_'))
+
+# The selection and properties functions of the abstractions are partial
+# applications of module functions, shared by the copies and the views.
+def _above_depth(level, depth, name, obj):
+  return depth < level
+
+def _has_property(key, value, depth, name, obj):
+  return (obj._properties or {}).get(key) == value
+
+def _flat_at_depth(cut, depth, obj):
+  return _flat_properties(obj) if depth == cut else None
+
+class ObjectView:
+  """Read-only view of an Object keeping only some of its sub-objects.
+
+  A view shares the properties, the relations and the sub-objects of the
+  viewed object: nothing is copied before :meth:`materialize` is called, and
+  the sub-views are only built when they are accessed. Hence the viewed
+  object must not be modified while the view is in use.
+
+  `select(depth, name, obj)` tells if the sub-object `obj` named `name` is
+  kept, `depth` being the depth of its parent (0 for the root of the view).
+  If given, `properties(depth, obj)` returns the properties replacing the
+  ones of `obj` in the view, or None to keep them.
+
+  If `check_relations` is True, as done by
+  :meth:`Object.remove_unvalid_relations`, the relations linking objects
+  that are not in the sub-hierarchy of the view are hidden."""
+  def __init__(self, obj, select, properties=None, depth=0,
+               check_relations=True):
+    self._obj = obj
+    self._select = select
+    self._get_properties = properties
+    self._depth = depth
+    self._check_relations = check_relations
+    self._properties = None
+    self._objects = None
+    self._relations = None
+    self._names = None
+
+  __repr__ = Object.__repr__
+
+  def _get_dict(self):
+    result = Object._get_dict(self)
+    if self.properties:
+      result["properties"] = dict(self.properties)
+    return result
+
+  @property
+  def extends(self):
+    return self._obj.extends
+
+  def get_extends(self):
+    """get_extends()
+    Get the value of the `extends` field."""
+    return self._obj.extends
+
+  @property
+  def properties(self):
+    if self._properties is None:
+      props = None
+      if self._get_properties is not None:
+        props = self._get_properties(self._depth, self._obj)
+      if props is None:
+        props = self._obj.properties
+      self._properties = MappingProxyType(props)
+    return self._properties
+
+  @property
+  def objects(self):
+    if self._objects is None:
+      objects = {}
+      for name, obj in self._obj.objects.items():
+        if self._select(self._depth, name, obj):
+          objects[name] = ObjectView(obj, self._select, self._get_properties,
+                                     self._depth + 1, self._check_relations)
+      self._objects = MappingProxyType(objects)
+    return self._objects
+
+  def _all_names(self):
+    """Return the set of the names of all the objects kept in the view."""
+    if self._names is None:
+      self._names = set()
+      for name, view in self.objects.items():
+        self._names.add(name)
+        self._names.update(view._all_names())
+    return self._names
+
+  @property
+  def relations(self):
+    if self._relations is None:
+      if not self._check_relations:
+        relations = dict(self._obj.relations)
+      else:
+        names = self._all_names()
+        relations = {}
+        for name, rlt in self._obj.relations.items():
+          if all(obj_name in names for obj_name in rlt.fromSet) and \
+             all(obj_name in names for obj_name in rlt.toSet):
+            relations[name] = rlt
+      self._relations = MappingProxyType(relations)
+    return self._relations
+
+  def materialize(self, _memo=None):
+    """materialize()
+    Return a new Object, independent from the viewed one, equal to the view."""
+    memo = {} if _memo is None else _memo
+    obj = Object()
+    memo[id(self._obj)] = obj
+    obj.extends = self.extends
+    if self.properties:
+      obj._properties = dict(self.properties)
+    for name, view in self.objects.items():
+      obj._attach_object(name, view.materialize(memo))
+    if self.relations:
+      obj._relations = {name: rlt._copy(obj, memo)
+                        for name, rlt in self.relations.items()}
+    return obj
 
 # TODO: consider in the fromSet and toSet the name: rauzy obj linked
 class Relation:
-  """Abstract Rauzy relation"""
+  """Abstract Rauzy relation
+
+  As for an Object, the attributes are stored in slots and the properties
+  dictionary is only created when a property is added. As for an Object, it
+  is a :class:`_Container`. A relation contained by an object also keeps its
+  name in this object (`_name`).
+
+  The linked objects must be modified with :meth:`add_from`, :meth:`add_to`,
+  :meth:`rm_from` and :meth:`rm_to`."""
+  __slots__ = ("parent", "_name", "extends", "fromSet", "toSet",
+               "directional", "_properties", "_dirty")
+
   def __init__(self):
     self.parent = None
+    self._name = None
     self.extends = None
     self.fromSet = {}
     self.toSet = {}
     self.directional = None
-    self.properties = {}
+    self._properties = None
+    self._dirty = False
+
+  properties = _container_property("_properties",
+                                   "Dictionary of the properties.")
+
+  def _container_changed(self, slot):
+    self._modified()
+
+  def _container_set(self, slot, key, value):
+    dict.__setitem__(self._properties, sys.intern(key), value)
+    self._modified()
+
+  def _container_del(self, slot, key):
+    dict.__delitem__(self._properties, key)
+    self._modified()
 
   @staticmethod
   def new(json_rlt, library):
     """Returns a relation representation of the json relation """
     ext = _extends(json_rlt)
-    if ext is None:
-      rlt = Relation()
-      toSet = _toSet(json_rlt)
-      if toSet is not None:
-        rlt.toSet = toSet
-      fromSet = _fromSet(json_rlt)
-      if fromSet is not None:
-        rlt.fromSet = fromSet
-    else:
-      rlt = Relation()
+    rlt = Relation()
+    if ext is not None:
       rlt.extends = ext
       # rlt = library.instanciate_rlt(ext)
 
+    # The json relation only stores the names of the linked objects. They are
+    # looked up by the object containing the relation.
+    toSet = _toSet(json_rlt)
+    if toSet:
+      rlt.toSet = dict.fromkeys(map(sys.intern, toSet))
+    fromSet = _fromSet(json_rlt)
+    if fromSet:
+      rlt.fromSet = dict.fromkeys(map(sys.intern, fromSet))
+
     directional = _directional(json_rlt)
     if directional is not None:
       rlt.directional = directional
 
     properties = _properties(json_rlt)
-    if properties is not None:
-      rlt.properties.update(properties)
+    if properties:
+      rlt._properties = {sys.intern(key): value
+                         for key, value in properties.items()}
 
     return rlt
 
   def __repr__(self):
     return json.dumps(self._get_dict(), indent=1)
 
+  def __eq__(self, other):
+    if not isinstance(other, Relation):
+      return NotImplemented
+    return self is other or self.fingerprint() == other.fingerprint()
+
+  def __hash__(self):
+    return hash(self.fingerprint())
+
+  def fingerprint(self):
+    """fingerprint()
+    Return a structural hash of the relation, as an hexadecimal string.
+
+    It covers the extends field, the names of the linked objects, the
+    directional nature and the properties. Contrary to the one of an Object,
+    it is not cached."""
+    content = ("relation", self.extends, sorted(self.fromSet),
+               sorted(self.toSet), self.directional,
+               sorted((self._properties or {}).items()))
+    return hashlib.sha1(repr(content).encode()).hexdigest()
+
+  def _modified(self):
+    """Mark the relation as dirty and invalidate the fingerprint of the object
+    containing the relation."""
+    self._dirty = True
+    if self.parent is not None:
+      name = self._name
+      # The relation may have been put directly in the relations dictionary
+      if self.parent.relations.get(name) is not self:
+        name = next((name for name, rlt in self.parent.relations.items()
+                     if rlt is self), None)
+        self._name = name
+      self.parent._modified("relations", name)
+
+  def _endpoint_changed(self, name):
+    """Update the reverse index of the object containing the relation, the
+    object named `name` having been added to or removed from the linked
+    objects."""
+    if self.parent is None or self.parent._endpoints is None:
+      return
+    endpoints = self.parent._endpoints
+    if self._name is None:
+      # The relation is not in the relations of its parent
+      self.parent._endpoints = None
+    elif name in self.fromSet or name in self.toSet:
+      endpoints.setdefault(name, {})[self._name] = self
+    elif name in endpoints:
+      relations = endpoints[name]
+      relations.pop(self._name, None)
+      if not relations:
+        del endpoints[name]
+
+  def is_dirty(self):
+    """is_dirty()
+    Tell if the relation has been modified through the API since it has been
+    loaded or saved."""
+    return self._dirty
+
+  def _resolve_endpoints(self):
+    """Look up the linked objects by their names in the object containing the
+    relation, for a relation which has been loaded with names only."""
+    for endpoints in (self.fromSet, self.toSet):
+      for name in endpoints:
+        endpoints[name] = self.parent._lookup_obj(name)
+
+  def _copy(self, parent, memo):
+    """Return a copy of the relation contained by `parent`. The linked objects
+    are replaced by their copies in `memo` (id(original) -> copy), or by None
+    if they have not been copied."""
+    rlt = Relation()
+    rlt.parent = parent
+    rlt._name = self._name
+    rlt.extends = self.extends
+    rlt.directional = self.directional
+    if self._properties:
+      rlt._properties = dict(self._properties)
+    for name, obj in self.fromSet.items():
+      rlt.fromSet[name] = memo.get(id(obj))
+    for name, obj in self.toSet.items():
+      rlt.toSet[name] = memo.get(id(obj))
+    return rlt
+
   def _get_dict(self):
     result = collections.OrderedDict()
     result["nature"] = "relation"
@@ -563,21 +1958,26 @@ class Relation:
     Add a property `key` => `value` on a relation. `key` must be a non-empty string.
 
     It raises an exception is there is already a property associated to `key`."""
-    if key in self.properties:
+    if self._properties is None:
+      self._properties = {}
+    elif key in self._properties:
       raise Exception("The key ", key, " already exist. Remove it first to modify its value.")
-    self.properties[key] = value
+    dict.__setitem__(self._properties, sys.intern(key), value)
+    self._modified()
 
   @typecheck
   def set_directional(self, value: bool):
     """set_directional(value)
     Set the directinal nature of a relation to `value`, which must be True or False"""
     self.directional = value
+    self._modified()
 
   @typecheck
   def set_extends(self, name: str):
     """set_extends(name)
     Set the extends field of the relation to the non-empty string `name`."""
     self.extends = name
+    self._modified()
     
   @typecheck
   def rm_property(self, key: str):
@@ -594,6 +1994,7 @@ class Relation:
 
     If the relation has already been added into an object, the existence of the
     linked object will be checked."""
+    name = sys.intern(name)
     if self.parent is None:
       #raise Exception("You must add the relation into an object before "
       #  "filling the fromSet and toSet fields.")
@@ -602,6 +2003,7 @@ class Relation:
       self.fromSet[name] = None
       return
 
+    self._modified()
     obj = self.parent.lookup_obj(name)
     if obj is None:
       #raise TypeError("The object named " + name + " has not been found.")
@@ -610,6 +2012,7 @@ class Relation:
       self.fromSet[name] = None
     else:
       self.fromSet[name] = obj
+    self._endpoint_changed(name)
   
   @typecheck
   def add_to(self, name: str):
@@ -618,6 +2021,7 @@ class Relation:
 
     If the relation has already been added into an object, the existence of the
     linked object will be checked."""
+    name = sys.intern(name)
     if self.parent is None:
       #raise Exception("You must add the relation into an object before "
       #  "filling the fromSet and toSet fields.")
@@ -626,6 +2030,7 @@ class Relation:
       self.toSet[name] = None
       return
 
+    self._modified()
     obj = self.parent.lookup_obj(name)
     if obj is None:
       #raise TypeError("The object named " + name + " has not been found.")
@@ -634,6 +2039,7 @@ class Relation:
       self.toSet[name] = None
     else:
       self.toSet[name] = obj
+    self._endpoint_changed(name)
   
   @typecheck
   def rm_from(self, name: str):
@@ -644,6 +2050,8 @@ class Relation:
     if name == "":
       raise TypeError(_function_name() + " first argument must be a non empty string")
     del self.fromSet[name]
+    self._modified()
+    self._endpoint_changed(name)
   
   @typecheck
   def rm_to(self, name: str):
@@ -654,6 +2062,8 @@ class Relation:
     if name == "":
       raise TypeError(_function_name() + " first argument must be a non empty string")
     del self.toSet[name]
+    self._modified()
+    self._endpoint_changed(name)
 
 def parse_object(obj, library, is_lib=False):
   """parse_object(obj, library, is_lib=False)
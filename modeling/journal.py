@@ -0,0 +1,254 @@
+r"""
+.. module:: journal
+
+The journal module saves the modifications of a model incrementally. Instead
+of rewriting the whole model file, the modifications made since the last save
+are appended to a journal file stored next to the model file (its path being
+the one of the model file followed by ".journal"). When the model is loaded,
+the journal is replayed on the objects of the model file.
+
+The modifications are found using the dirty state of the objects (see
+:meth:`modeling.core.Object.is_dirty`): only the modified objects and their
+ancestors are visited.
+
+The first line of the journal identifies the model file it applies to. Each
+following line holds the json list of the records of one save. A record is
+one of:
+
+  - ["extends", path, value]: set the extends field of an object,
+  - ["set", path, kind, name, value]: add or replace the object, the relation
+    or the property `name`, `kind` being "objects", "relations" or
+    "properties",
+  - ["remove", path, kind, name]: remove the object, the relation or the
+    property `name`,
+  - ["clear", path, kind]: remove all the objects, relations or properties.
+
+`path` is the list of the names leading to the object from the root.
+
+Saving the modifications of a model::
+
+  >>> from modeling.model import *
+  >>> loaded_model = Model.load('car.model')
+  >>> loaded_model.obj.add_property("color", "red")
+  >>> loaded_model.save(incremental=True)
+
+The :meth:`modeling.model.Model.save` function uses this module when it is
+called with `incremental=True`, and :meth:`modeling.model.Model.load` always
+replays the journal of a model file.
+"""
+
+import os, json
+from . import core
+from .stream import iter_json, _CHUNK_SIZE
+
+__all__ = ["journal_path", "iter_records", "append", "replay", "remove"]
+
+# Version of the journal format
+VERSION = 1
+
+_KINDS = ("objects", "relations", "properties")
+
+def journal_path(model_path):
+  """journal_path(model_path)
+  Return the path of the journal of the model file `model_path`."""
+  return model_path + ".journal"
+
+def _base(model_path):
+  """Return the identity of the model file `model_path`, which changes when
+  the file is rewritten."""
+  stat = os.stat(model_path)
+  return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+def iter_records(obj):
+  """iter_records(obj)
+  Generate the records describing the modifications of `obj` and of its
+  sub-objects since they have been loaded or saved.
+
+  The records of an object precede the ones of its sub-objects. A modified
+  sub-object is written entirely, and the objects it contains are hence not
+  visited.
+
+  The names of a container are written in the order of the container, and a
+  name which has been removed and added again is removed before being
+  written, so that the replay puts it back at the end of the container. The
+  replayed containers hence have the order of the saved ones."""
+  stack = [((), obj)]
+  while stack:
+    path, obj = stack.pop()
+    changes = obj._dirty
+    if not isinstance(changes, dict):
+      continue
+
+    if "extends" in changes:
+      yield ["extends", list(path), obj.extends]
+    for kind in _KINDS:
+      if kind not in changes:
+        continue
+      container = getattr(obj, kind)
+      names = changes[kind]
+      if names is None:
+        yield ["clear", list(path), kind]
+        for name, value in container.items():
+          yield ["set", list(path), kind, name, value]
+        continue
+      present = []
+      for name in names:
+        if name in container:
+          present.append(name)
+        else:
+          yield ["remove", list(path), kind, name]
+      if len(present) > 1:
+        present = [name for name in container if name in names]
+      for name in present:
+        if names[name]:
+          yield ["remove", list(path), kind, name]
+        yield ["set", list(path), kind, name, container[name]]
+
+    written = changes.get("objects", ())
+    if written is None:
+      continue
+    for name, sub_obj in obj.objects.items():
+      if isinstance(sub_obj._dirty, dict) and name not in written:
+        stack.append((path + (name,), sub_obj))
+
+def _complete_size(file):
+  """Return the size of the journal `file`, opened in binary mode, without
+  its last line if it is incomplete, i.e. if an append has been
+  interrupted."""
+  position = file.seek(0, os.SEEK_END)
+  while position > 0:
+    start = max(0, position - _CHUNK_SIZE)
+    file.seek(start)
+    index = file.read(position - start).rfind(b"\n")
+    if index >= 0:
+      return start + index + 1
+    position = start
+  return 0
+
+def append(obj, model_path):
+  """append(obj, model_path)
+  Append the modifications of `obj`, the root object of the model file
+  `model_path`, to the journal of the model file and mark `obj` as clean.
+  Return the size of the journal.
+
+  The records are written as a single line, so that a save which has been
+  interrupted is ignored by :func:`replay` and overwritten by the next
+  append."""
+  records = list(iter_records(obj))
+  path = journal_path(model_path)
+  if not records:
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+  fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+  with os.fdopen(fd, "r+b") as file:
+    size = _complete_size(file)
+    file.seek(size)
+    file.truncate()
+    if size == 0:
+      header = {"journal": VERSION, "base": _base(model_path)}
+      file.write((json.dumps(header) + "\n").encode("utf-8"))
+    for chunk in iter_json(records):
+      file.write(chunk.encode("utf-8"))
+    file.write(b"\n")
+    file.flush()
+    os.fsync(file.fileno())
+    size = file.tell()
+  obj.mark_clean()
+  return size
+
+def _lookup(root, path):
+  """Return the object reached from `root` by the names of `path`."""
+  obj = root
+  for name in path:
+    if name not in obj.objects:
+      raise Exception("The object " + "/".join(path) + " of the journal has "
+                      "not been found.")
+    obj = obj.objects[name]
+  return obj
+
+def _apply(root, record, library, relations):
+  """Apply the `record` to the model whose root object is `root`. The added
+  relations are appended to `relations`, their linked objects being looked up
+  once all the records have been applied."""
+  op, path = record[0], record[1]
+  obj = _lookup(root, path)
+  if op == "extends":
+    obj.extends = record[2]
+    obj._modified("extends")
+  elif op == "set":
+    kind, name, value = record[2:]
+    if kind == "objects":
+      obj._attach_object(name, core.Object.new(value, library))
+    elif kind == "relations":
+      rlt = core.Relation.new(value, library)
+      obj._attach_relation(name, rlt)
+      relations.append(rlt)
+    else:
+      obj._set_property(name, value)
+  elif op == "remove" or op == "clear":
+    kind = record[2]
+    container = getattr(obj, kind)
+    names = [record[3]] if op == "remove" else list(container)
+    for name in names:
+      if name not in container:
+        continue
+      if kind == "objects":
+        obj._detach_object(name)
+      elif kind == "relations":
+        obj.remove_relation(name)
+      else:
+        obj.remove_property(name)
+  else:
+    raise Exception("Unknown record " + str(op) + " in the journal.")
+
+def replay(obj, model_path, library=None):
+  """replay(obj, model_path, library=None)
+  Apply the journal of the model file `model_path` to `obj`, the root object
+  loaded from this file, and mark `obj` as clean. Return the number of saves
+  which have been replayed.
+
+  A journal which does not match the model file (e.g. because the model file
+  has been rewritten since) is ignored, as well as the last save if it has
+  been interrupted."""
+  path = journal_path(model_path)
+  try:
+    file = open(path, "rb")
+  except FileNotFoundError:
+    return 0
+
+  count = 0
+  relations = []
+  with file:
+    try:
+      header = json.loads(file.readline().decode("utf-8"))
+      valid = header.get("journal") == VERSION and \
+              header.get("base") == _base(model_path)
+    except (ValueError, AttributeError):
+      valid = False
+    if not valid:
+      print("The journal", path, "does not match the model file. It is "
+            "ignored.")
+      return 0
+
+    for line in file:
+      if not line.endswith(b"\n"):
+        print("The last save of the journal", path, "has been interrupted. "
+              "It is ignored.")
+        break
+      for record in json.loads(line.decode("utf-8")):
+        _apply(obj, record, library, relations)
+      count += 1
+
+  for rlt in relations:
+    if rlt.parent is not None:
+      rlt._resolve_endpoints()
+  obj.mark_clean()
+  return count
+
+def remove(model_path):
+  """remove(model_path)
+  Remove the journal of the model file `model_path`, if it exists."""
+  try:
+    os.unlink(journal_path(model_path))
+  except FileNotFoundError:
+    pass
@@ -16,8 +16,9 @@ Example of the initialization and the addition of an object class::
   >>> print(lib)
 """
 
-import json, collections, copy
-from . import core
+import json, collections, collections.abc, copy
+from . import core, stream
+from .binary import is_binary, save as save_binary
 from .typechecker import *
 from copy import deepcopy
 
@@ -55,6 +56,26 @@ class Dependency:
     """Return true if and only if depends_on is empty"""
     return len(self.depends_on) == 0
 
+class DependencyCycleError(SystemError):
+  """Raised when the dependencies between classes contain a cycle.
+
+  `cycle` is the list of the names of the classes of one cycle, each class
+  depending on the next one and the last one on the first one. `classes` is
+  the set of the names of all the classes that could not be ordered."""
+  def __init__(self, cycle, classes):
+    SystemError.__init__(self, "The chain dependency contains cycles ! The "
+                         "cycle is: " + " -> ".join(cycle + cycle[:1]) +
+                         ". Aborting.")
+    self.cycle = cycle
+    self.classes = classes
+
+def _node_extends(node):
+  """Return the extends field of a json object or relation, or of an already
+  built one."""
+  if isinstance(node, (core.Object, core.Relation)):
+    return node.extends or None
+  return core._extends(node)
+
 class Dependency_graph:
   """A dependency graph containing dependencies.
 
@@ -63,14 +84,15 @@ class Dependency_graph:
   dependencies.
 
   To put it simply, we build a graph where the links represent dependencies
-  (A -> B iff B is needed for A). Then, we remove the nodes that have no
-  dependencies, remove the dependencies implying this node and remove again the
-  nodes that have no dependencies and so on.
+  (A -> B iff B is needed for A). Then, we take the nodes that have no
+  dependencies, remove the dependencies implying these nodes and take again
+  the nodes that have no dependencies and so on (Kahn's algorithm).
 
   Both the linked and the linking nodes are aware of the existence of a
   dependency. This make it possible to have an efficient algorithm (i.e. linear
   in the number of dependencies) to check that the graph has a correct ordering
-  of the element such that all elements are after its dependencies."""
+  of the element such that all elements are after its dependencies. The
+  algorithm is iterative, so that it does not depend on the recursion limit."""
   def __init__(self):
     self.graph = {}
 
@@ -86,7 +108,7 @@ class Dependency_graph:
   def remove_class(self, name: str):
     """remove_class(name)
     Remove the dependecy attached to the name `name`."""
-    del graph[name]
+    del self.graph[name]
 
   @debug_typecheck
   def add_dependency(self, name1: str, name2: str):
@@ -101,20 +123,75 @@ class Dependency_graph:
     """remove_dependencies(name, ordered_dict)
     Remove the dependencies on the element named name.
 
-    It adds in ordered_dict the elements, the last dependency of which is name."""
-    if name not in self.graph:
-      return
+    It adds in ordered_dict the elements, the last dependency of which is name,
+    removes them from the graph and removes the dependencies on them in turn."""
+    stack = [self.graph[name]]
+    while stack:
+      el = stack.pop()
+      while el.used_by:
+        other_element = self.graph[el.used_by.pop()]
+        other_element.depends_on.remove(el.name)
+        if len(other_element.depends_on) == 0:
+          ordered_dict[other_element.name] = other_element.element
+          del self.graph[other_element.name]
+          stack.append(other_element)
 
-    el = self.graph[name]
-    if len(el.used_by) == 0:
-      return
-    else:
-      other_element = self.graph[el.used_by.pop()]
-      other_element.depends_on.remove(el.name)
-      if len(other_element.depends_on) == 0:
-        ordered_dict[other_element.name] = other_element.element
-        del self.graph[other_element.name]
-        self.remove_dependencies(other_element.name, ordered_dict)
+  @debug_typecheck
+  def build_levels(self) -> list:
+    """build_levels()
+    Return the list of the dependency levels. A level is an ordered dictionary
+    of the elements whose dependencies are all in the previous levels.
+
+    Within a level, the elements are in the order in which they have been
+    added. It raises a :class:`DependencyCycleError` if the dependencies
+    contain a cycle. The graph is not modified."""
+    position = {name: i for i, name in enumerate(self.graph)}
+    remaining = {name: len(node.depends_on) for name, node in self.graph.items()}
+    level = [name for name, count in remaining.items() if count == 0]
+    levels = []
+    while level:
+      levels.append(collections.OrderedDict(
+        (name, self.graph[name].element) for name in level))
+      next_level = []
+      for name in level:
+        del remaining[name]
+        for user in self.graph[name].used_by:
+          remaining[user] -= 1
+          if remaining[user] == 0:
+            next_level.append(user)
+      next_level.sort(key=position.__getitem__)
+      level = next_level
+
+    if remaining:
+      raise DependencyCycleError(self._find_cycle(remaining, position),
+                                 set(remaining))
+    return levels
+
+  def _find_cycle(self, remaining, position):
+    """Return a cycle among the `remaining` elements, i.e. the elements that
+    could not be ordered. Each of them depends on at least one other."""
+    path = []
+    index = {}
+    name = min(remaining, key=position.__getitem__)
+    while name not in index:
+      index[name] = len(path)
+      path.append(name)
+      name = min((dep for dep in self.graph[name].depends_on if dep in remaining),
+                 key=position.__getitem__)
+    return path[index[name]:]
+
+  def closure(self, names):
+    """closure(names)
+    Return the set of the elements named in `names` and of all the elements
+    they depend on, directly or not."""
+    result = set()
+    stack = list(names)
+    while stack:
+      name = stack.pop()
+      if name not in result:
+        result.add(name)
+        stack.extend(self.graph[name].depends_on)
+    return result
 
   @debug_typecheck
   def build(self) -> (collections.OrderedDict):
@@ -122,34 +199,197 @@ class Dependency_graph:
     Return an ordered dictionnary of the elements in a valid order.
 
     The order respects the dependency chains: no element is inserted before all
-    its dependencies have been inserted."""
+    its dependencies have been inserted. It is the concatenation of the levels
+    returned by :meth:`build_levels`."""
     no_dependency = collections.OrderedDict()
-    copy_graph = dict(self.graph)
-    for name, node in copy_graph.items():
-      # The element may have been already removed
-      if name not in self.graph:
-        continue
-
-      if node.has_no_dependency():
-        # We add the element that has no dependency in the no dependency list
-        no_dependency[node.name] = node.element
-        # And we remove this element in the elements that were depending on it
-        self.remove_dependencies(node.name, no_dependency)
-        # And we remove it in the graph
-        del self.graph[name]
-
-    if len(self.graph) == 0:
-      self.graph = copy_graph
-      return no_dependency
-    else:
-      raise SystemError("The chain dependency contains cycles ! Aborting.")
+    for level in self.build_levels():
+      no_dependency.update(level)
+    return no_dependency
+
+
+class _LayeredDict(collections.abc.MutableMapping):
+  """A dictionary of classes made of an own layer on top of other mappings.
+
+  `layers` are the underlying mappings, from the lowest to the highest one: a
+  name defined in several layers takes the value of the highest one and the
+  position of the lowest one. The underlying mappings are shared and never
+  modified: additions go to the own layer and removals of inherited names are
+  recorded in `_removed`. :meth:`writable` copies an inherited class into the
+  own layer before it is modified."""
+  def __init__(self, layers):
+    self._own = collections.OrderedDict()
+    self._layers = list(layers)
+    self._removed = set()
+
+  def _inherited(self, name):
+    """Return the layer defining `name`, None if it is not inherited."""
+    if name in self._removed:
+      return None
+    for layer in reversed(self._layers):
+      if name in layer:
+        return layer
+    return None
+
+  def __getitem__(self, name):
+    if name in self._own:
+      return self._own[name]
+    layer = self._inherited(name)
+    if layer is None:
+      raise KeyError(name)
+    return layer[name]
+
+  def __contains__(self, name):
+    return name in self._own or self._inherited(name) is not None
+
+  def __setitem__(self, name, value):
+    self._own[name] = value
+
+  def __delitem__(self, name):
+    if name not in self:
+      raise KeyError(name)
+    self._own.pop(name, None)
+    if self._inherited(name) is not None:
+      self._removed.add(name)
+
+  def __iter__(self):
+    seen = set()
+    for layer in self._layers:
+      for name in layer:
+        if name not in seen and name not in self._removed:
+          seen.add(name)
+          yield name
+    for name in self._own:
+      if name not in seen:
+        yield name
+
+  def __len__(self):
+    return sum(1 for name in self)
+
+  def __repr__(self):
+    return repr(collections.OrderedDict(self.items()))
+
+  def writable(self, name):
+    """writable(name)
+    Return the class `name` after having copied it into the own layer if it
+    is shared with an underlying mapping."""
+    if name not in self._own:
+      self._own[name] = deepcopy(self[name])
+      self._removed.discard(name)
+    return self._own[name]
+
+class _Pending:
+  """Json data of a class which has not been built yet."""
+  __slots__ = ("json",)
+
+  def __init__(self, json_data):
+    self.json = json_data
+
+class _PendingDict(collections.abc.MutableMapping):
+  """A dictionary of classes some of which are only built when they are first
+  accessed.
+
+  `_dict` maps the names to the classes, or to the _Pending json data of the
+  classes which have not been built yet. They are built by `build(json_data)`
+  and keep their position."""
+  def __init__(self, items, build):
+    self._dict = collections.OrderedDict(items)
+    self._build = build
+
+  def __getitem__(self, name):
+    value = self._dict[name]
+    if isinstance(value, _Pending):
+      value = self._dict[name] = self._build(value.json)
+    return value
+
+  def __contains__(self, name):
+    return name in self._dict
+
+  def __setitem__(self, name, value):
+    self._dict[name] = value
+
+  def __delitem__(self, name):
+    del self._dict[name]
+
+  def __iter__(self):
+    return iter(self._dict)
+
+  def __len__(self):
+    return len(self._dict)
+
+  def __repr__(self):
+    return repr(collections.OrderedDict(self.items()))
+
+  def __deepcopy__(self, memo):
+    return deepcopy(collections.OrderedDict(self.items()), memo)
+
+  def add_pending(self, name, json_data):
+    """add_pending(name, json_data)
+    Add the class `name` which will be built from `json_data` when it is
+    first accessed."""
+    self._dict[name] = _Pending(json_data)
+
+  def built_values(self):
+    """built_values()
+    Return the list of the classes which have been built."""
+    return [value for value in self._dict.values()
+            if not isinstance(value, _Pending)]
 
+def _built_classes(classes):
+  """Return the classes of the dictionary `classes` which have been built."""
+  if isinstance(classes, _PendingDict):
+    return classes.built_values()
+  return classes.values()
 
 class Library:
-  """Abstraction of a library storing object and relation classes."""
+  """Abstraction of a library storing object and relation classes.
+
+  The object classes resolved by :meth:`instanciate_obj` (i.e. with the
+  properties of the classes they extend merged in) are cached in `_resolved`
+  as (resolved class, name, class, fingerprint, entry) tuples, `entry` being
+  the cache entry of the extended class it has been built from (None for a
+  class extending nothing). `_dependents` maps a class name to the names of
+  the cached classes directly extending it. An entry is dropped, with the
+  ones built from it, when its class is added, removed or renamed, and is
+  ignored if one of the classes of its chain of entries has been replaced or
+  modified, as told by its fingerprint. The classes must hence be modified through the API
+  of the objects and relations or through their `objects`, `relations` and
+  `properties` dictionaries (see :class:`core.Object`), which keep their
+  fingerprints up to date.
+
+  `_dirty` tells if classes have been added, removed or renamed since the
+  library has been loaded or saved."""
   def __init__(self):
     self.dic_obj = collections.OrderedDict()
     self.dic_rlt = collections.OrderedDict()
+    self._resolved = {}
+    self._dependents = {}
+    self._dirty = False
+
+  def is_dirty(self):
+    """is_dirty()
+    Tell if the library has been modified through the API since it has been
+    loaded or saved, i.e. if classes have been added, removed or renamed, or
+    if one of the classes has been modified."""
+    return self._dirty or \
+      any(obj.is_dirty() for obj in _built_classes(self.dic_obj)) or \
+      any(rlt.is_dirty() for rlt in _built_classes(self.dic_rlt))
+
+  def mark_clean(self):
+    """mark_clean()
+    Forget the modifications of the library and of its classes."""
+    self._dirty = False
+    for obj in _built_classes(self.dic_obj):
+      obj.mark_clean()
+    for rlt in _built_classes(self.dic_rlt):
+      rlt._dirty = False
+
+  def _invalidate_obj(self, name):
+    """Drop the cached resolved classes built from the class `name`."""
+    stack = [name]
+    while stack:
+      name = stack.pop()
+      self._resolved.pop(name, None)
+      stack.extend(self._dependents.pop(name, ()))
 
   @typecheck
   def add_obj_class(self, name: str, obj: (core.Object) ):
@@ -162,6 +402,8 @@ class Library:
       print("The object class ", name, " is already present in the library.")
     else:
       self.dic_obj[name] = obj
+      self._invalidate_obj(name)
+      self._dirty = True
   
   @typecheck
   def add_rlt_class(self, name: str, rlt: (core.Relation) ):
@@ -174,69 +416,84 @@ class Library:
       print("The relation class ", name, " is already preset in the library.")
     else:
       self.dic_rlt[name] = rlt
+      self._dirty = True
 
   @typecheck
   def rm_obj_class(self, name: str):
     """rm_obj_class(name)
     Remove the definition of an object class associated to `name` in the library."""
     del self.dic_obj[name]
+    self._invalidate_obj(name)
+    self._dirty = True
   
   @typecheck
   def rm_rlt_class(self, name: str):
     """rm_rlt_class(name)
     Remove the definition of a relation class associated to `name` in the library."""
     del self.dic_rlt[name]
+    self._dirty = True
 
   @typecheck
   def rename_obj_class(self, current_name: str, new_name: str):
     """rename_obj_class(self, current_name, new_name)
     Rename an object class from `current_name` to `new_name`.
     Both the names must be non empty and the `new_name` must not already exist."""
-    if new_name == "" | current_name == "":
+    if new_name == "" or current_name == "":
       print("It is impossible to give an empty string as a name.")
       return
     if new_name in self.dic_obj:
       print("Renaming to ", new_name, " is impossible since this class already exists.")
       return
-    obj = self.dic_obj[current_name]
-    rm_obj_class(current_name)
+    # A class shared with merged libraries is copied before it is moved
+    obj = self.get_obj(current_name)
+    self.rm_obj_class(current_name)
     self.dic_obj[new_name] = obj
+    self._invalidate_obj(new_name)
+    self._dirty = True
 
   @typecheck
   def rename_rlt_class(self, current_name: str, new_name: str):
     """rename_rlt_class(self, current_name, new_name)
     Rename a relation class from `current_name` to "new_name`.
     Both the names must be non empty and the `new_name` must not already exist."""
-    if new_name == "" | current_name == "":
+    if new_name == "" or current_name == "":
       print("It is impossible to give an empty string as a name.")
       return
     if new_name in self.dic_rlt:
       print("Renaming to ", new_name, " is impossible since this class already exists.")
       return
-    rlt = self.dic_rlt[current_name]
-    rm_rlt_class(current_name)
+    rlt = self.get_rlt(current_name)
+    self.rm_rlt_class(current_name)
     self.dic_rlt[new_name] = rlt
+    self._dirty = True
 
   def get_obj(self, name: str):
     """get_obj(name)
-    Return the object associated with `name`"""
+    Return the object associated with `name`
+
+    In a library built by a shared merge, the class is first copied if it is
+    shared with the merged libraries."""
+    if isinstance(self.dic_obj, _LayeredDict):
+      return self.dic_obj.writable(name)
     return self.dic_obj[name]
       
   def get_rlt(self, name: str):
     """get_rlt(name)
     Return the library associated with `name`"""
+    if isinstance(self.dic_rlt, _LayeredDict):
+      return self.dic_rlt.writable(name)
     return self.dic_rlt[name]
   
   def _get_dict(self):
     """Return a dictionary representing the library."""
     result = collections.OrderedDict()
     result["nature"] = "library"
-    result["objects"] = self.dic_obj
-    result["relations"] = self.dic_rlt
+    result["objects"] = collections.OrderedDict(self.dic_obj.items())
+    result["relations"] = collections.OrderedDict(self.dic_rlt.items())
     return result
 
   @staticmethod
-  def merge(lib1, lib2, overloading=False):
+  def merge(lib1, lib2, overloading=False, shared=False):
     """Return a new library containing both `lib1` and `lib2`. The new library
     is totally new and does not share references.
 
@@ -244,34 +501,42 @@ class Library:
     defined in both libraries.
 
     If `overloading` = True, then elements in `lib2` will overload elements
-    in `lib1` without raising any exception."""
-    newlib = Library()
+    in `lib1` without raising any exception.
+
+    If `shared` = True, the new library is layered on top of `lib1` and `lib2`
+    instead of copying them: their classes are shared, and a class is only
+    copied into the new library when it is modified through it (i.e. when it
+    is returned by :meth:`get_obj` or :meth:`get_rlt`). Classes added, removed
+    or renamed in the new library do not affect `lib1` and `lib2`, but later
+    changes of `lib1` and `lib2` are visible in the new library.
 
-    new_dict_obj = deepcopy(lib1.dic_obj)
-    new_dict_rlt = deepcopy(lib1.dic_rlt)
-    newlib.dic_obj = new_dict_obj
-    newlib.dic_rlt = new_dict_rlt
+    The new library starts with an empty cache of resolved classes."""
+    if overloading is not True:
+      Library._check_conflicts(lib1.dic_obj, lib2.dic_obj, "object")
+      Library._check_conflicts(lib1.dic_rlt, lib2.dic_rlt, "relation")
 
-    if overloading is True:
-      new_dict_obj.update(deepcopy(lib2.dic_obj))
-      new_dict_rlt.update(deepcopy(lib2.dic_rlt))
+    newlib = Library()
+    if shared:
+      newlib.dic_obj = _LayeredDict([lib1.dic_obj, lib2.dic_obj])
+      newlib.dic_rlt = _LayeredDict([lib1.dic_rlt, lib2.dic_rlt])
       return newlib
 
-    # Copy of objects
-    for name in lib2.dic_obj:
-      if name in new_dict_obj:
-        raise Exception("The object class " + name + " is in both library."
-          " Abording merge.")
-      new_dict_obj[name] = deepcopy(lib2.dic_obj[name])
+    newlib.dic_obj.update(deepcopy(lib1.dic_obj))
+    newlib.dic_rlt.update(deepcopy(lib1.dic_rlt))
+    newlib.dic_obj.update(deepcopy(lib2.dic_obj))
+    newlib.dic_rlt.update(deepcopy(lib2.dic_rlt))
+    return newlib
 
-    # Copy of relations
-    for name in lib2.dic_rlt:
-      if name in new_dict_rlt:
-        raise Exception("The relation class " + name + " is in both library."
-          " Abording merge.")
-      new_dict_rlt[name] = deepcopy(lib2.dic_rlt[name])
+  @staticmethod
+  def _check_conflicts(dic1, dic2, nature):
+    """Raise an exception if a class is defined in both `dic1` and `dic2`.
 
-    return newlib
+    Only the names of the smaller dictionary are looked up in the other one."""
+    small, large = (dic1, dic2) if len(dic1) <= len(dic2) else (dic2, dic1)
+    for name in small:
+      if name in large:
+        raise Exception("The " + nature + " class " + name + " is in both "
+          "library. Abording merge.")
 
   def __repr__(self):
     class ComplexEncoder(json.JSONEncoder):
@@ -286,29 +551,94 @@ class Library:
     return json.dumps(self._get_dict(), cls=ComplexEncoder, indent=1)
 
   @typecheck
-  def save(self, lib_path: str):
-    """save(lib_path)
-    Save the library as a json string into a file with path is `lib_path`."""
-    library_file = open(lib_path, mode='w')
-    library_file.write(str(self))
+  def save(self, lib_path: str, binary=None):
+    """save(lib_path, binary=None)
+    Save the library as a json string into a file with path is `lib_path`.
+
+    If `binary` is True, the library is saved in the binary format of
+    :mod:`modeling.binary`. By default, the format is given by the extension
+    of `lib_path` (see :func:`modeling.binary.is_binary`).
+
+    The file is written by chunks and atomically (see
+    :func:`modeling.stream.save_json`). The library is then marked as
+    clean (see :meth:`is_dirty`)."""
+    if binary is None:
+      binary = is_binary(lib_path)
+    if binary:
+      save_binary(self, lib_path)
+    else:
+      stream.save_json(self, lib_path, indent=1)
+    self.mark_clean()
 
   @typecheck
-  def instanciate_obj(self, class_name: str):
-    """instanciate_obj(class_name)
+  def instanciate_obj(self, class_name: str, shared=False):
+    """instanciate_obj(class_name, shared=False)
     Returns an instance of `class_name` present in library.
 
-    The extends field is set to the class_name and all attributes are copied"""
+    The extends field is set to the class_name and all attributes are copied.
+
+    If `shared` is True, the instance is a lazy copy of the class (see
+    :meth:`core.Object.lazy_copy`): it shares the definition of the class and
+    only the parts of it that are accessed or modified are copied. The class
+    must then not be modified while its instances are in use."""
     if class_name not in self.dic_obj:
       raise KeyError("The object class ", class_name, " does not exist in the library.")
 
-    obj = self.dic_obj[class_name]
-    if obj.extends is None:
-      return copy.deepcopy(self.dic_obj[class_name])
-    else:
-      res = self.instanciate_obj(obj.get_extends)
-      res.set_extends(None)
-      res.properties.update(obj.properties)
-      return res
+    resolved = self._resolve_obj(class_name)
+    if shared:
+      return resolved.lazy_copy()
+    return copy.deepcopy(resolved)
+
+  def _resolve_obj(self, class_name):
+    """Return the object class `class_name` with the properties of the classes
+    it extends merged in, using the cache of resolved classes.
+
+    The chain of the extended classes is walked up to the first class with a
+    valid cache entry, and the classes of the chain are then resolved and
+    cached on the way back, so that the length of the chain is not limited.
+
+    The returned object must not be modified."""
+    pending = []
+    seen = set()
+    name = class_name
+    entry = self._cached_obj(name)
+    while entry is None:
+      if name not in self.dic_obj:
+        raise KeyError("The object class ", name, " does not exist in the library.")
+      if name in seen:
+        cycle = [pending_name for pending_name, obj in pending]
+        cycle = cycle[cycle.index(name):]
+        raise DependencyCycleError(cycle, set(cycle))
+      seen.add(name)
+      obj = self.dic_obj[name]
+      pending.append((name, obj))
+      if obj.extends is None:
+        break
+      name = obj.get_extends()
+      entry = self._cached_obj(name)
+
+    for name, obj in reversed(pending):
+      if entry is None:
+        resolved = obj
+      else:
+        resolved = copy.deepcopy(entry[0])
+        resolved.set_extends(None)
+        resolved.properties.update(obj.properties)
+        self._dependents.setdefault(obj.get_extends(), set()).add(name)
+      entry = (resolved, name, obj, obj.fingerprint(), entry)
+      self._resolved[name] = entry
+    return entry[0]
+
+  def _cached_obj(self, class_name):
+    """Return the cache entry of the resolved class `class_name`, or None if
+    there is none or if one of the classes it has been built from has been
+    replaced or modified."""
+    entry = link = self._resolved.get(class_name)
+    while link is not None:
+      resolved, name, obj, fingerprint, link = link
+      if self.dic_obj.get(name) is not obj or obj.fingerprint() != fingerprint:
+        return None
+    return entry
 
   @typecheck
   def instanciate_rlt(self, class_name: str):
@@ -329,12 +659,54 @@ class Library:
       res.properties.update(rlt.properties)
       return res
 
+  def _new_rlt(self, rlt):
+    """Return the relation class built from the json relation `rlt`, which can
+    also be an already built relation. The fromSet and toSet are set to
+    empty."""
+    if isinstance(rlt, core.Relation):
+      rauzy_rlt = rlt
+    else:
+      rauzy_rlt = core.Relation.new(rlt, self)
+    rauzy_rlt.fromSet = {}
+    rauzy_rlt.toSet = {}
+    return rauzy_rlt
+
+  def _new_obj(self, obj):
+    """Return the object class built from the json object `obj`, which can
+    also be an already built object."""
+    if isinstance(obj, core.Object):
+      return obj
+    return core.Object.new(obj, self)
+
+  def _add_classes(self, attribute, ordered, required, new):
+    """Add into the dictionary of classes named `attribute` the classes of the
+    ordered dictionary `ordered`, built by `new`.
+
+    If `required` is not None, only the classes it contains are built now,
+    the other ones being built when they are first accessed."""
+    classes = getattr(self, attribute)
+    if required is not None and not isinstance(classes, _LayeredDict):
+      if not isinstance(classes, _PendingDict):
+        classes = _PendingDict(classes.items(), new)
+        setattr(self, attribute, classes)
+      for key, element in ordered.items():
+        if key in required or isinstance(element, (core.Object, core.Relation)):
+          classes[key] = new(element)
+        else:
+          classes.add_pending(key, element)
+      return
+    for key, element in ordered.items():
+      classes[key] = new(element)
+
   @debug_typecheck
-  def _load_relations(self, json_rlt_lib):
+  def _load_relations(self, json_rlt_lib, required=None):
     """Add into the library the relation classes corresponding to the json data.
 
     The fromSet and toSet are set to empty.
-    If a relation class, its propeties replace the one of its parent"""
+    If a relation class, its propeties replace the one of its parent.
+
+    If `required` is not None, only the classes it names and the classes they
+    depend on are built, the other ones being built when first accessed."""
     graph = Dependency_graph()
     # We add all the relations in the graph
     for key, rlt in json_rlt_lib.items():
@@ -342,20 +714,21 @@ class Library:
 
     # We add the dependencies between the relations
     for key, rlt in json_rlt_lib.items():
-      ext = core._extends(rlt)
+      ext = _node_extends(rlt)
       if ext is not None:
         graph.add_dependency(key, ext)
 
     ordered_rlt = graph.build()
-
-    for key, rlt in ordered_rlt.items():
-      rauzy_rlt = core.Relation.new(rlt, self)
-      rauzy_rlt.fromSet = {}
-      rauzy_rlt.toSet = {}
-      self.dic_rlt[key] = rauzy_rlt
+    if required is not None:
+      required = graph.closure(name for name in required if name in graph.graph)
+    self._add_classes("dic_rlt", ordered_rlt, required, self._new_rlt)
 
   @debug_typecheck
-  def _load_objects(self, json_obj_lib):
+  def _load_objects(self, json_obj_lib, required=None):
+    """Add into the library the object classes corresponding to the json data.
+
+    If `required` is not None, only the classes it names and the classes they
+    depend on are built, the other ones being built when first accessed."""
     graph = Dependency_graph()
     # We add all the objects in the graph
     for key, obj in json_obj_lib.items():
@@ -365,36 +738,49 @@ class Library:
     # They come from the extends field and the extends field of the
     # contained objects
     for key, obj in json_obj_lib.items():
-      ext = core._extends(obj)
+      ext = _node_extends(obj)
       if ext is not None:
         graph.add_dependency(key, ext)
-      contained_obj = core._objects(obj)
+      if isinstance(obj, core.Object):
+        contained_obj = obj.objects
+      else:
+        contained_obj = core._objects(obj)
       if contained_obj is not None:
         for name, value in contained_obj.items():
-          ext = core._extends(value)
+          ext = _node_extends(value)
           if ext is not None:
             graph.add_dependency(key, ext)
 
     ordered_obj = graph.build()
-
-    for key, obj in ordered_obj.items():
-      self.dic_obj[key] = core.Object.new(obj, self)
+    if required is not None:
+      required = graph.closure(name for name in required if name in graph.graph)
+    self._add_classes("dic_obj", ordered_obj, required, self._new_obj)
+    for key in ordered_obj:
+      self._invalidate_obj(key)
       
-  def load(self, json_lib):
-    """load(json_lib)
+  def load(self, json_lib, objects=None, relations=None):
+    """load(json_lib, objects=None, relations=None)
     Load a library from the json data.
 
+    The classes of the json data can also be already built objects and
+    relations, as returned by :func:`modeling.stream.load_json`.
+
+    If `objects` (resp. `relations`) is given, only the object (resp.
+    relation) classes it names and the classes they depend on are built. The
+    other classes are built when they are first accessed, e.g. by
+    :meth:`get_obj` or :meth:`instanciate_obj`.
+
     If information is already present in the library, the new classes will be added."""
     if core._nature(json_lib) != "library":
       raise Exception("This is not a valid dictionary")
 
     ## We load relations
     if "relations" in json_lib:
-      self._load_relations(json_lib["relations"])
+      self._load_relations(json_lib["relations"], relations)
 
     # We load objects
     if "objects" in json_lib:
-      self._load_objects(json_lib["objects"])
+      self._load_objects(json_lib["objects"], objects)
     
 
 if __name__ == "__main__":
@@ -22,16 +22,64 @@ Saving a model from a file::
 import os, json, collections
 from .core import *
 from .library import *
+from .stream import load_json as load_json_stream, save_json, _object_items
+from .binary import is_binary, load_lazy, loads as load_binary, \
+  save as save_binary
+from . import journal
+
+# An incremental save rewrites the model file when its journal becomes larger
+# than this ratio of the size of the model file
+_COMPACTION_RATIO = 0.5
+
+def _loads(data, binary):
+  """Return the json data of a model or library file whose content is
+  `data`, a string or a bytes-like object, in the binary format if `binary`
+  is True."""
+  if binary:
+    return load_binary(data)
+  if isinstance(data, (bytearray, memoryview)):
+    data = bytes(data)
+  return json.loads(data)
+
+def _class_references(json_model):
+  """Return the sets of the names of the object classes and of the relation
+  classes extended in the json model, whose objects and relations can also be
+  already built."""
+  objects = set()
+  relations = set()
+  stack = [json_model]
+  while stack:
+    node = stack.pop()
+    if isinstance(node, Object):
+      extends, sub_objects, node_relations = \
+        node.extends, node.objects, node.relations
+    else:
+      extends, sub_objects, node_relations = \
+        core._extends(node), core._objects(node), core._relations(node)
+    if extends:
+      objects.add(extends)
+    if sub_objects:
+      stack.extend(sub_objects.values())
+    for rlt in (node_relations or {}).values():
+      extends = rlt.extends if isinstance(rlt, Relation) else core._extends(rlt)
+      if extends:
+        relations.add(extends)
+  return objects, relations
 
 class Model:
   """
   A Model contains both a library and an object description using that library.
+
+  `_base` is the (absolute path of the model file, object, library path,
+  library) tuple of the files the model has been loaded from or saved to,
+  on which its journal applies (see :mod:`modeling.journal`).
   """
   def __init__(self):
     self.lib = Library()
     self.lib_path = None
     self.obj = None
     self.model_name = None
+    self._base = None
 
   @typecheck
   def set_lib_path(self, lib_path: str):
@@ -66,38 +114,135 @@ class Model:
     return self.lib
 
   @staticmethod
-  def load(file):
+  def load(file, stream=False, binary=None, lazy=False):
     """Parse a file as a json object representing a model. 
 
-    `file` must be a relative path to the model file."""
-    json_data = open(file)
-    json_model = json.load(json_data)
+    `file` can be a relative path to the model file, a file object or a bytes
+    buffer containing the model. The file is read and parsed only once.
+
+    If `stream` is True, the model and its library are loaded incrementally
+    with :func:`modeling.stream.load_json`: the objects are built while the
+    files are read, without holding their whole json data in memory.
+
+    If `binary` is True, the model is read in the binary format of
+    :mod:`modeling.binary`. By default, the format is given by
+    :func:`modeling.binary.is_binary`, as for the library file.
+
+    If `lazy` is True, the objects are only built when they are first
+    accessed. A model in the binary format is mapped in memory and returned
+    immediately (see :func:`modeling.binary.load_lazy`), and so is the
+    library if it is in the binary format. A json model is parsed, but its
+    objects are built from their json data on demand (see
+    :meth:`core.Object.new`).
+
+    The path of the library is relative to the model file. For a file object
+    without name or a bytes buffer, it is relative to the current directory.
+    Only the classes of the library extended by the model, and the classes
+    they depend on, are built (none if `lazy` is True): the other ones are
+    built when they are first accessed (see :meth:`Library.load`).
+
+    If the model file has a journal written by an incremental save (see
+    :meth:`save`), the journal is replayed on the loaded object.
+
+    The paths of the model file and of the library are kept in
+    `model_name` and `lib_path`, so that :meth:`save` writes the model back
+    to the files it has been loaded from."""
+    if isinstance(file, (bytes, bytearray, memoryview)):
+      file_path = None
+    elif hasattr(file, "read"):
+      file_path = getattr(file, "name", None)
+      if not isinstance(file_path, str):
+        file_path = None
+    else:
+      file_path = file
+
+    if binary is None:
+      binary = is_binary(file)
+    if lazy and binary:
+      root, lib_file = load_lazy(file)
+    else:
+      if stream and not binary:
+        json_model = load_json_stream(file)
+      elif isinstance(file, (bytes, bytearray, memoryview)):
+        json_model = _loads(file, binary)
+      elif hasattr(file, "read"):
+        json_model = _loads(file.read(), binary)
+      else:
+        with open(file, "rb") as model_file:
+          json_model = _loads(model_file.read(), binary)
+      lib_file = core._library(json_model)
 
     resulting_model = Model()
-    rlt_library = resulting_model.lib.dic_rlt
-    obj_library = resulting_model.lib.dic_obj
 
     # Build the library
-    lib_file = core._library(json_model)
     if lib_file is not None:
+      resulting_model.lib_path = lib_file
+      directory_path = os.path.dirname(file_path) if file_path else ""
+      lib_path = os.path.join(directory_path, lib_file)
       try:
-        directory_path = os.path.dirname(file)
-        location = open(os.path.join(directory_path, lib_file))
+        location = open(lib_path, "rb")
       except IOError as err:
         raise IOError(format(err) + " \n Library file not found. \
           The library path must be relative to the model file.")
 
       # We load the library using ordered dictionaries
-      json_lib = json.load(location)
-      resulting_model.lib .load(json_lib)
-
-    json_obj = load_json(file)
-    resulting_model.obj = Object.new(json_obj, resulting_model.lib)
-    resulting_model.model_name = os.path.basename(file)
+      with location:
+        if lazy and is_binary(lib_path):
+          json_lib = load_lazy(location)[0]
+        elif stream and not is_binary(lib_path):
+          json_lib = load_json_stream(location)
+        else:
+          json_lib = _loads(location.read(), is_binary(lib_path))
+      if lazy:
+        objects, relations = (), ()
+      else:
+        objects, relations = _class_references(json_model)
+      resulting_model.lib.load(json_lib, objects, relations)
+
+    if lazy and binary:
+      resulting_model.obj = root
+    else:
+      resulting_model.obj = Object.new(json_model, resulting_model.lib, lazy)
+    if file_path is not None:
+      resulting_model.model_name = file_path
+      journal.replay(resulting_model.obj, file_path, resulting_model.lib)
+      resulting_model._base = (os.path.abspath(file_path), resulting_model.obj,
+                               lib_file, resulting_model.lib)
 
     return resulting_model
 
-  def save(self, indentation=1):
+  def _same_base(self):
+    """Tell if the model file and the library file would be saved where
+    the model has been loaded from or last saved to, with the same object and
+    library."""
+    if self._base is None:
+      return False
+    path, obj, lib_path, lib = self._base
+    return path == os.path.abspath(self.model_name) and obj is self.obj and \
+           lib_path == self.lib_path and lib is self.lib
+
+  def compact(self, indentation=1, binary=None):
+    """compact(indentation=1, binary=None)
+    Rewrite the model file entirely and remove its journal (see :meth:`save`).
+    The library file is not written.
+
+    `indentation` and `binary` are as for :meth:`save`."""
+    if binary is None:
+      binary = is_binary(self.model_name)
+    if binary:
+      save_binary(self.obj, self.model_name, self.lib_path)
+    else:
+      # We get the items of the root object, its sub-objects being written
+      # directly by the streaming writer
+      json_obj = collections.OrderedDict(_object_items(self.obj))
+      # We add the library parameter in the root object
+      json_obj["library"] = self.lib_path
+      # We save the json representation into the file
+      save_json(json_obj, self.model_name, indent=indentation)
+    journal.remove(self.model_name)
+    self.obj.mark_clean()
+
+  def save(self, indentation=1, binary=None, incremental=False):
     """Save the model into an object file and a library file.
 
     | The object must has been defined using :meth:`.set_obj()`.
@@ -105,6 +250,21 @@ class Model:
     | The library path must be non-empty if the library has been set using :meth:`.set_lib()`.
 
     `identation` define the indentation used for the json output. Its default value is 1.
+
+    If `binary` is True, the object file is written in the binary format of
+    :mod:`modeling.binary`. By default, the format of each file is given by
+    its extension (see :func:`modeling.binary.is_binary`).
+
+    The files are written by chunks and atomically (see
+    :func:`modeling.stream.save_json`).
+
+    If `incremental` is True and the model is saved to the files it has been
+    loaded from or last saved to, only the modifications made since then
+    are appended to the journal of the model file (see
+    :mod:`modeling.journal`), and the library file is only written if the
+    library has been modified. When the journal becomes larger than half of
+    the model file, the model file is rewritten instead (see
+    :meth:`compact`).
     """
     """
     The object must be non empty (i.e. not None).
@@ -119,19 +279,26 @@ class Model:
       raise Exception("You have not specified the name of the model file. \
                       Put the name in Model.model_name")
 
-    obj_file = open(self.model_name, mode='w')
-    # We get the dictionary representation of the object
-    json_obj = self.obj._get_dict()
-    # We add the library parameter in the root object
-    json_obj["library"] = self.lib_path
-    # We save the json representation into the file
-    obj_file.write(json.dumps(json_obj, indent=indentation))
-
     if self.lib is not None and self.lib_path is None:
       #TODO: make a default name for it
       raise Exception("You are using a library without any name for it")
+
+    incremental = incremental and self._same_base()
+    if incremental:
+      size = journal.append(self.obj, self.model_name)
+      if size > _COMPACTION_RATIO * os.path.getsize(self.model_name):
+        self.compact(indentation, binary)
+    else:
+      self.compact(indentation, binary)
+
+    self._base = (os.path.abspath(self.model_name), self.obj, self.lib_path,
+                  self.lib)
     if self.lib is not None:
       lib_filename = os.path.join(os.path.dirname(self.model_name), self.lib_path)
+      if incremental and not self.lib.is_dirty():
+        print("Model saved in", self.model_name, "with library unchanged in",
+              lib_filename +".")
+        return
       self.lib.save(lib_filename)
       print("Model saved in", self.model_name, "with library saved in",
             lib_filename +".")
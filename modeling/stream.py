@@ -0,0 +1,379 @@
+r"""
+.. module:: stream
+
+The stream module loads and saves models and libraries incrementally. The file
+is read by chunks and the objects and relations are built as soon as their
+json description has been read, so that the json data of the whole file is
+never held in memory at once. Conversely, the objects are saved by walking
+them and writing their json description by chunks.
+
+Loading the data of a model file::
+
+  >>> from modeling.stream import *
+  >>> json_model = load_json('examples/car.model')
+  >>> obj = json_model["objects"]["wheel1"]
+
+Saving an object::
+
+  >>> save_json(obj, 'wheel.model')
+
+The :meth:`modeling.model.Model.load` function uses this module when it is
+called with `stream=True`, and the :meth:`modeling.model.Model.save` and
+:meth:`modeling.library.Library.save` functions always use it.
+"""
+
+import io, os, re, json, codecs, tempfile, collections.abc
+from json.decoder import scanstring
+from . import core
+
+__all__ = ["load_json", "iter_json", "save_json"]
+
+# Size of the chunks read from the files
+_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# A scalar is first delimited by _SCALAR, then checked by _NUMBER
+_SCALAR = re.compile(r"[-+.0-9a-zA-Z]+")
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?")
+_LITERALS = {"true": True, "false": False, "null": None}
+
+def _reader(file):
+  """Return a function reading a chunk of text from `file`, which can be a
+  file object opened in text or binary mode. It returns "" at the end."""
+  decoder = codecs.getincrementaldecoder("utf-8")()
+  def read(size):
+    chunk = file.read(size)
+    if isinstance(chunk, str):
+      return chunk
+    return decoder.decode(chunk, final=not chunk)
+  return read
+
+def _tokens(read, chunk_size):
+  """Generate the (token, value) pairs of the json text returned by `read`.
+
+  The token is one of "{", "}", "[", "]", ":", "," with a None value, "str"
+  for a string or "value" for a number or a literal."""
+  buf = ""
+  pos = 0
+  eof = False
+  while True:
+    pos = _WHITESPACE.match(buf, pos).end()
+    if pos == len(buf):
+      if eof:
+        return
+      buf = read(chunk_size)
+      pos = 0
+      eof = not buf
+      continue
+
+    char = buf[pos]
+    if char in "{}[]:,":
+      yield char, None
+      pos += 1
+      continue
+
+    if char == '"':
+      try:
+        value, end = scanstring(buf, pos + 1)
+      except json.JSONDecodeError:
+        if eof:
+          raise
+        # The string is not complete: we read at least as much as the buffer
+        # size to stay linear with long strings
+        more = read(max(chunk_size, len(buf) - pos))
+        eof = not more
+        buf = buf[pos:] + more
+        pos = 0
+        continue
+      yield "str", value
+      pos = end
+      continue
+
+    match = _SCALAR.match(buf, pos)
+    if (match is None or match.end() == len(buf)) and not eof:
+      more = read(chunk_size)
+      eof = not more
+      buf = buf[pos:] + more
+      pos = 0
+      continue
+    if match is None:
+      raise json.JSONDecodeError("Expecting value", buf, pos)
+
+    text = match.group()
+    number = _NUMBER.fullmatch(text)
+    if number is not None:
+      if number.group(1) or number.group(2):
+        value = float(text)
+      else:
+        value = int(text)
+    elif text in _LITERALS:
+      value = _LITERALS[text]
+    else:
+      raise json.JSONDecodeError("Expecting value", buf, pos)
+    yield "value", value
+    pos = match.end()
+
+def _child_role(role, key):
+  """Return the role of the value associated to `key` in a dictionary of the
+  role `role`.
+
+  The role of the root and of the objects is "node": their "objects" and
+  "relations" fields contain respectively objects and relations."""
+  if role == "root" or role == "node":
+    if key == "objects":
+      return "objects"
+    if key == "relations":
+      return "relations"
+  elif role == "objects":
+    return "node"
+  elif role == "relations":
+    return "relation"
+  return "data"
+
+def _parse(tokens, library):
+  """Parse the json text given by the `tokens` generator.
+
+  It builds the objects and relations contained in the root as soon as their
+  description is complete, and returns the root dictionary. The parser is
+  iterative, so that the depth of the file is not limited by the recursion
+  limit."""
+  # The stack contains the [container, key, role] of the opened containers
+  stack = []
+  expect = "value"
+  for token, value in tokens:
+    if expect == "key" or expect == "key or end":
+      if token == "str":
+        stack[-1][1] = value
+        expect = "colon"
+        continue
+      if token != "}" or expect != "key or end":
+        raise json.JSONDecodeError("Expecting property name", token, 0)
+      value = _close(stack, library)
+    elif expect == "colon":
+      if token != ":":
+        raise json.JSONDecodeError("Expecting ':' delimiter", token, 0)
+      expect = "value"
+      continue
+    elif expect == "next":
+      is_dict = isinstance(stack[-1][0], dict)
+      if token == ",":
+        expect = "key" if is_dict else "value"
+        continue
+      if token != ("}" if is_dict else "]"):
+        raise json.JSONDecodeError("Expecting ',' delimiter", token, 0)
+      value = _close(stack, library)
+    else:
+      if token == "{":
+        if stack:
+          container, key, role = stack[-1]
+          role = _child_role(role, key)
+        else:
+          role = "root"
+        stack.append([{}, None, role])
+        expect = "key or end"
+        continue
+      if token == "[":
+        stack.append([[], None, "data"])
+        expect = "value or end"
+        continue
+      if token == "]" and expect == "value or end":
+        value = _close(stack, library)
+      elif token != "str" and token != "value":
+        raise json.JSONDecodeError("Expecting value", token, 0)
+
+    # A value is complete
+    if not stack:
+      for token, extra in tokens:
+        raise json.JSONDecodeError("Extra data", token, 0)
+      return value
+    container, key, role = stack[-1]
+    if isinstance(container, dict):
+      container[key] = value
+    else:
+      container.append(value)
+    expect = "next"
+
+  raise json.JSONDecodeError("Unexpected end of data", "", 0)
+
+def _close(stack, library):
+  """Close the last opened container and return its value, i.e. the built
+  object or relation if it describes one."""
+  container, key, role = stack.pop()
+  if role == "node":
+    return core.Object.new(container, library)
+  if role == "relation":
+    return core.Relation.new(container, library)
+  return container
+
+def load_json(file, library=None, chunk_size=_CHUNK_SIZE):
+  """load_json(file, library=None, chunk_size=65536)
+  Parse incrementally a json model or library and return its root dictionary.
+
+  `file` can be a path, a file object or a bytes buffer. It is read by chunks
+  of `chunk_size` characters. The objects and relations contained in the root
+  are built as soon as their description has been read, the root itself being
+  returned as a dictionary: it can be given to :meth:`core.Object.new` or to
+  :meth:`library.Library.load`."""
+  if isinstance(file, (bytes, bytearray, memoryview)):
+    file = io.BytesIO(file)
+  if not hasattr(file, "read"):
+    with open(file, encoding="utf-8") as json_file:
+      return _parse(_tokens(_reader(json_file), chunk_size), library)
+  return _parse(_tokens(_reader(file), chunk_size), library)
+
+def _object_items(obj):
+  """Generate the (key, value) pairs of the json description of an object, in
+  the order of :meth:`core.Object._get_dict`."""
+  yield "nature", "object"
+  if obj.extends is not None:
+    yield "extends", obj.extends
+  if obj.objects:
+    yield "objects", obj.objects
+  if obj.relations:
+    yield "relations", obj.relations
+  if obj.properties:
+    yield "properties", obj.properties
+
+def _relation_items(rlt):
+  """Generate the (key, value) pairs of the json description of a relation, in
+  the order of :meth:`core.Relation._get_dict`."""
+  yield "nature", "relation"
+  if rlt.extends is not None:
+    yield "extends", rlt.extends
+  if rlt.fromSet:
+    yield "from", list(rlt.fromSet)
+  if rlt.toSet:
+    yield "to", list(rlt.toSet)
+  if rlt.directional is not None:
+    yield "directional", rlt.directional
+  if rlt.properties:
+    yield "properties", rlt.properties
+
+def _library_items(lib):
+  """Generate the (key, value) pairs of the json description of a library."""
+  yield "nature", "library"
+  yield "objects", lib.dic_obj
+  yield "relations", lib.dic_rlt
+
+def _items(value):
+  """Return (is_dict, iterator of the items) for a container or a node, and
+  None for a json scalar."""
+  if isinstance(value, (core.Object, core.ObjectView)):
+    return True, _object_items(value)
+  if isinstance(value, core.Relation):
+    return True, _relation_items(value)
+  if hasattr(value, "dic_obj") and hasattr(value, "dic_rlt"):
+    return True, _library_items(value)
+  if isinstance(value, collections.abc.Mapping):
+    return True, iter(value.items())
+  if isinstance(value, (list, tuple)):
+    return False, iter(value)
+  return None
+
+# Marks the end of the items of a container
+_END = object()
+
+def iter_json(value, indent=None):
+  """iter_json(value, indent=None)
+  Generate the json text of `value` by chunks.
+
+  `value` can contain objects, relations and libraries, which are walked
+  directly instead of being converted to dictionaries first. The text is the
+  same as the one of `json.dumps(value, indent=indent)` for their dictionary
+  representation. The walk is iterative, so that the depth of the objects is
+  not limited by the recursion limit."""
+  if indent is None:
+    item_separator, newline = ", ", None
+  else:
+    item_separator, newline = ",", "\n"
+    if not isinstance(indent, str):
+      indent = " " * indent
+
+  # The stack contains the [is_dict, iterator, first] of the opened containers
+  stack = []
+  while True:
+    items = _items(value)
+    if items is None:
+      yield json.dumps(value)
+    else:
+      stack.append([items[0], items[1], True])
+      yield "{" if items[0] else "["
+
+    # We look for the next value to write
+    while stack:
+      frame = stack[-1]
+      is_dict, iterator, first = frame
+      item = next(iterator, _END)
+      if item is _END:
+        stack.pop()
+        if not first and newline is not None:
+          yield newline + indent * len(stack)
+        yield "}" if is_dict else "]"
+        continue
+
+      chunk = "" if first else item_separator
+      frame[2] = False
+      if newline is not None:
+        chunk += newline + indent * len(stack)
+      if is_dict:
+        key, value = item
+        chunk += json.dumps(key) + ": "
+      else:
+        value = item
+      yield chunk
+      break
+    else:
+      return
+
+def save_json(value, path, indent=1, buffer_size=_CHUNK_SIZE):
+  """save_json(value, path, indent=1, buffer_size=65536)
+  Write the json text of `value` (see :func:`iter_json`) into the file `path`.
+
+  The text is written by chunks of about `buffer_size` characters into a
+  temporary file of the same directory, which then replaces `path`. Hence
+  `path` is either left untouched or completely written, even if the saving
+  fails."""
+  _write_atomic(path, iter_json(value, indent), buffer_size)
+
+def _write_atomic(path, chunks, buffer_size=_CHUNK_SIZE, binary=False):
+  """Write the `chunks` (bytes if `binary` is True, str otherwise) into a
+  temporary file of the directory of `path`, which then replaces `path`."""
+  directory = os.path.dirname(path) or "."
+  fd, tmp_path = tempfile.mkstemp(dir=directory,
+                                  prefix="." + os.path.basename(path),
+                                  suffix=".tmp")
+  empty = b"" if binary else ""
+  try:
+    if binary:
+      tmp_file = os.fdopen(fd, "wb")
+    else:
+      tmp_file = os.fdopen(fd, "w", encoding="utf-8")
+    with tmp_file:
+      buffer = []
+      size = 0
+      for chunk in chunks:
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+          tmp_file.write(empty.join(buffer))
+          buffer = []
+          size = 0
+      tmp_file.write(empty.join(buffer))
+      tmp_file.flush()
+      os.fsync(tmp_file.fileno())
+    _copy_mode(path, tmp_path)
+    os.replace(tmp_path, path)
+  except BaseException:
+    os.unlink(tmp_path)
+    raise
+
+def _copy_mode(path, tmp_path):
+  """Give to `tmp_path` the permissions of `path`, or the default permissions
+  of a new file if it does not exist (mkstemp creates private files)."""
+  try:
+    mode = os.stat(path).st_mode & 0o7777
+  except FileNotFoundError:
+    umask = os.umask(0)
+    os.umask(umask)
+    mode = 0o666 & ~umask
+  os.chmod(tmp_path, mode)
@@ -59,6 +59,14 @@
 # The (6 times longer) source code with self-tests is available from:
 # http://www.targeted.org/python/recipes/typecheck3000.py
 #
+# The checking mode is chosen when a function is decorated, i.e. when the
+# module defining it is imported. It is read from the RAUZY_TYPECHECK
+# environment variable and can be changed with set_mode():
+#
+# "full" (default): the checks are done by a generic proxy
+# "fast": the checks are compiled into a flat guard specific to the function
+# "off": the functions are not wrapped at all
+#
 ################################################################################
 
 __all__ = [
@@ -79,7 +87,7 @@ __all__ = [
 
 # utility methods
 
-"disable",
+"disable", "set_mode",
 
 ]
 
@@ -87,6 +95,7 @@ __all__ = [
 
 import inspect
 import functools
+import os
 import re
 
 callable = lambda x: hasattr(x, "__call__")
@@ -95,11 +104,20 @@ nothing = lambda x: x is None
 
 ################################################################################
 
-_enabled = True
+_modes = ("off", "fast", "full")
+
+_mode = os.environ.get("RAUZY_TYPECHECK", "full")
+if _mode not in _modes:
+    _mode = "full"
+
+def set_mode(mode):
+    global _mode
+    if mode not in _modes:
+        raise ValueError("the typecheck mode must be one of {0}".format(", ".join(_modes)))
+    _mode = mode
 
 def disable():
-    global _enabled
-    _enabled = False
+    set_mode("off")
 
 ################################################################################
 
@@ -159,12 +177,13 @@ class IterableChecker(Checker):
         self._checks = tuple(Checker.create(x) for x in iter(cont))
 
     def check(self, value):
-        if not iterable(value):
+        if not isinstance(value, self._cls) or len(value) != len(self._checks):
             return False
-        vals = tuple(iter(value))
-        return isinstance(value, self._cls) and len(self._checks) == len(vals) and \
-               functools.reduce(lambda r, c_v: r and c_v[0].check(c_v[1]),
-                                zip(self._checks, vals), True)
+        for c, v in zip(self._checks, value):
+            if not c.check(v):
+                return False
+        else:
+            return True
 
 Checker.register(iterable, IterableChecker)
 
@@ -304,7 +323,7 @@ def typecheck(method, *, input_parameter_error = InputParameterError,
                          return_value_error = ReturnValueError):
 
     argspec = inspect.getfullargspec(method)
-    if not argspec.annotations or not _enabled:
+    if not argspec.annotations or _mode == "off":
         return method
 
     default_arg_count = len(argspec.defaults or [])
@@ -336,6 +355,11 @@ def typecheck(method, *, input_parameter_error = InputParameterError,
                                                   "with its typecheck".format(n))
             arg_checkers[i] = (n, checker)
 
+    if _mode == "fast":
+        proxy = _compile_guard(method, method_name, arg_checkers, kwarg_checkers,
+                               return_checker, input_parameter_error, return_value_error)
+        return functools.update_wrapper(proxy, method)
+
     def typecheck_invocation_proxy(*args, **kwargs):
 
         for check, arg in zip(arg_checkers, args):
@@ -365,6 +389,58 @@ def typecheck(method, *, input_parameter_error = InputParameterError,
 
     return typecheck_invocation_proxy
 
+def _format_value(value):
+    return str(value) == "" and "''" or value
+
+def _raise_input_error(error, method_name, arg_name, value):
+    raise error("{0}() has got an incompatible value "
+                "for {1}: {2}".format(method_name, arg_name, _format_value(value)))
+
+def _raise_return_error(error, method_name, result):
+    raise error("{0}() has returned an incompatible "
+                "value: {1}".format(method_name, _format_value(result)))
+
+def _compile_guard(method, method_name, arg_checkers, kwarg_checkers,
+                   return_checker, input_parameter_error, return_value_error):
+
+    # Generate the source of a proxy doing the same checks as
+    # typecheck_invocation_proxy, unrolled for the given checkers. Class
+    # checks are inlined as isinstance calls.
+
+    namespace = { "method": method, "no_value": Checker.no_value,
+                  "input_error": functools.partial(_raise_input_error, input_parameter_error, method_name),
+                  "return_error": functools.partial(_raise_return_error, return_value_error, method_name) }
+
+    def condition(checker, key, expr):
+        if type(checker) is TypeChecker:
+            namespace[key] = checker._cls
+            return "isinstance({0}, {1})".format(expr, key)
+        namespace[key] = checker.check
+        return "{0}({1})".format(key, expr)
+
+    lines = ["def typecheck_guard_proxy(*args, **kwargs):"]
+    checked_args = [(i, check) for i, check in enumerate(arg_checkers) if check is not None]
+    if checked_args:
+        lines.append("    nargs = len(args)")
+    for i, (arg_name, checker) in checked_args:
+        expr = "args[{0}]".format(i)
+        lines.append("    if nargs > {0} and not {1}:".format(i, condition(checker, "a{0}".format(i), expr)))
+        lines.append("        input_error({0!r}, {1})".format(arg_name, expr))
+    for j, (arg_name, checker) in enumerate(kwarg_checkers.items()):
+        expr = "kwargs.get({0!r}, no_value)".format(arg_name)
+        lines.append("    kwarg = {0}".format(expr))
+        lines.append("    if not {0}:".format(condition(checker, "k{0}".format(j), "kwarg")))
+        lines.append("        input_error({0!r}, kwarg)".format(arg_name))
+    lines.append("    result = method(*args, **kwargs)")
+    if return_checker is not None:
+        lines.append("    if not {0}:".format(condition(return_checker, "r", "result")))
+        lines.append("        return_error(result)")
+    lines.append("    return result")
+
+    code = compile("\n".join(lines), "<typecheck guard of {0}>".format(method_name), "exec")
+    exec(code, namespace)
+    return namespace["typecheck_guard_proxy"]
+
 def debug_typecheck(method, *, input_parameter_error = InputParameterError,
                          return_value_error = ReturnValueError):
     if not __debug__:
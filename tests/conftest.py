@@ -0,0 +1,56 @@
+import pytest
+
+from modeling.core import *
+from modeling.library import *
+from modeling.model import Model
+
+
+def _model(path, lib_path):
+  """Return a model saved into `path`, whose library contains the object
+  classes wheel and car, and the relation class link."""
+  library = Library()
+  wheel = Object()
+  wheel.add_property("radius", "16")
+  library.add_obj_class("wheel", wheel)
+  car = Object()
+  for name in ("front", "back"):
+    obj = Object()
+    obj.set_extends("wheel")
+    car.add_object(name, obj)
+  library.add_obj_class("car", car)
+  unused = Object()
+  unused.set_extends("car")
+  library.add_obj_class("unused", unused)
+  link = Relation()
+  link.set_directional(True)
+  library.add_rlt_class("link", link)
+
+  root = Object()
+  for i in range(20):
+    obj = Object()
+    obj.set_extends("car")
+    obj.add_property("number", str(i))
+    obj.add_property("name", "café \"" + str(i) + "\"\n")
+    root.add_object("car" + str(i), obj)
+  for i in range(10):
+    rlt = Relation()
+    rlt.set_extends("link")
+    root.add_relation("r" + str(i), rlt)
+    rlt.add_from("car" + str(i))
+    rlt.add_to("car" + str(i + 10))
+  model = Model()
+  model.set_obj(root)
+  model.set_lib(library)
+  model.set_lib_path(lib_path)
+  model.set_obj_path(str(path))
+  model.save()
+  return model
+
+
+@pytest.fixture
+def saved_model(tmp_path):
+  """Return a function saving a model (see _model) into the temporary
+  directory, under the names `name` and `lib_path`."""
+  def _saved_model(name="model.model", lib_path="model.lib"):
+    return _model(str(tmp_path / name), lib_path)
+  return _saved_model
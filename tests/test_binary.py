@@ -0,0 +1,103 @@
+import json
+
+from modeling import core
+from modeling.core import *
+from modeling.model import Model
+from modeling import binary
+from modeling.binary import *
+
+
+def _read(path):
+  with open(path, encoding="utf-8") as json_file:
+    return json_file.read()
+
+
+def test_convert_back_and_forth(saved_model, tmp_path):
+  model = saved_model()
+  for name in ("model.model", "model.lib"):
+    source = str(tmp_path / name)
+    convert(source, source + ".rzb")
+    assert is_binary(source + ".rzb")
+    with open(source + ".rzb", "rb") as binary_file:
+      assert is_binary(binary_file.read())
+    convert(source + ".rzb", source + ".json")
+    assert _read(source + ".json") == _read(source)
+
+
+def test_load_a_binary_model(saved_model):
+  model = saved_model()
+  # The library stays in the json format
+  model.set_obj_path(model.model_name + ".rzb")
+  model.save()
+  loaded = Model.load(model.model_name)
+  assert str(loaded.obj) == str(model.obj)
+  assert loaded.lib_path == "model.lib"
+  assert repr(loaded.lib) == repr(model.lib)
+
+  model.set_lib_path("model.lib.rzb")
+  model.save()
+  loaded = Model.load(model.model_name)
+  assert repr(loaded.lib) == repr(model.lib)
+  assert str(loaded.obj) == str(model.obj)
+
+
+def test_equal_objects_are_written_once():
+  root = Object()
+  for i in range(100):
+    obj = Object()
+    obj.add_property("color", "red")
+    obj.add_object("wheel", Object())
+    root.add_object("car" + str(i), obj)
+  root.add_property("number", "1")
+  data = dumps(root, "model.lib")
+  # The nodes of the root, of a car and of a wheel
+  assert binary._HEADER.unpack_from(data)[4] == 3
+
+  loaded = loads(data)
+  assert loaded["library"] == "model.lib"
+  obj = Object.new(loaded, None)
+  assert str(obj) == str(root)
+  first, second = obj.objects["car0"], obj.objects["car1"]
+  assert first is not second
+  first.add_property("size", "big")
+  assert "size" not in second.properties
+
+
+def test_properties_of_any_json_value():
+  root = {"nature": "object", "properties": {"text": "a", "number": 1,
+                                             "list": [1, "b", None]}}
+  assert json.loads(str(Object.new(loads(dumps(Object.new(root, None))),
+                                   None))) == root
+
+
+def test_load_a_binary_model_lazily(saved_model, tmp_path):
+  model = saved_model("model.rzb", "model.lib.rzb")
+  loaded = Model.load(model.model_name, lazy=True)
+  root = loaded.obj
+  assert not root.is_dirty()
+  assert root.objects["car0"].properties["number"] == "0"
+  # Only the accessed containers have been read
+  car = root.objects["car1"]
+  for slot in (core._OBJECTS_SLOT, core._RELATIONS_SLOT,
+               core._PROPERTIES_SLOT):
+    assert slot.__get__(car) is core._UNBUILT
+  assert root.relations["r0"].fromSet["car0"] is root.objects["car0"]
+  assert str(root) == str(model.obj)
+  assert loaded.lib.instanciate_obj("car").objects["back"].extends == "wheel"
+  assert repr(loaded.lib) == repr(model.lib)
+
+  # The mapped file is replaced by the save
+  root.objects["car2"].add_property("color", "red")
+  root.remove_object("car19")
+  expected = str(root)
+  loaded.save()
+  assert str(Model.load(model.model_name, lazy=True).obj) == expected
+  assert str(Model.load(model.model_name).obj) == expected
+
+
+def test_load_bytes_lazily(saved_model):
+  model = saved_model("model.rzb", "model.lib.rzb")
+  with open(model.model_name, "rb") as model_file:
+    root, lib_path = load_lazy(model_file.read())
+  assert lib_path == "model.lib.rzb"
+  assert str(root) == str(model.obj)
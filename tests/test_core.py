@@ -0,0 +1,522 @@
+import pytest
+
+from modeling.core import *
+
+
+def _tree(names):
+  """Return an object with a chain of sub-objects for each path of `names`,
+  a path being a string of names separated by '/'."""
+  root = Object()
+  for path in names:
+    parent = root
+    for name in path.split("/"):
+      if name not in parent.objects:
+        parent.add_object(name, Object())
+      parent = parent.objects[name]
+  return root
+
+
+def _scan(obj):
+  """Return the {name: set of id(parent)} and {(key, value): set of id(obj)}
+  dictionaries of the sub-hierarchy of `obj`, found without the indexes."""
+  names, properties, stack = {}, {}, [obj]
+  while stack:
+    parent = stack.pop()
+    for name, sub in parent.objects.items():
+      names.setdefault(name, set()).add(id(parent))
+      for item in sub.properties.items():
+        properties.setdefault(item, set()).add(id(sub))
+      stack.append(sub)
+  return names, properties
+
+
+def _check_indexes(obj):
+  names, properties = _scan(obj)
+  for name, parents in names.items():
+    assert {id(parent) for parent in obj.lookup_obj_parents(name)} == parents
+  for (key, value), objs in properties.items():
+    assert {id(found) for found in obj.find_by_property(key, value)} == objs
+
+
+def test_lookup_returns_the_first_match_in_preorder():
+  root = _tree(["a/x/dup", "a/y", "b/dup", "dup2/z"])
+  a, b = root.objects["a"], root.objects["b"]
+  assert root.lookup_obj_parent("dup") is a.objects["x"]
+  assert root.lookup_obj("dup") is a.objects["x"].objects["dup"]
+  # Adding a later match does not change the first one
+  b.objects["dup"].add_object("dup", Object())
+  assert root.lookup_obj_parent("dup") is a.objects["x"]
+  # Adding an earlier match changes it, as a search would
+  a.add_object("dup", Object())
+  assert root.lookup_obj_parent("dup") is a
+  a.remove_object("dup")
+  a.remove_object("x")
+  assert root.lookup_obj_parent("dup") is b
+
+
+def test_lookup_of_shared_objects():
+  wheel = Object()
+  wheel.add_object("tire", Object())
+  car = Object()
+  car.lookup_obj("tire")
+  for name in ("wheel1", "wheel2", "wheel3"):
+    car.add_object(name, wheel)
+  assert car.lookup_obj_parents("tire") == [wheel]
+  car.remove_object("wheel1")
+  car.remove_object("wheel2")
+  assert car.lookup_obj("tire") is wheel.objects["tire"]
+  car.remove_object("wheel3")
+  assert car.lookup_obj("tire") is None
+  assert car.lookup_obj_parents("tire") == []
+
+
+def test_indexes_follow_direct_writes():
+  root = _tree(["a/b/c", "a/d", "e/b"])
+  root.lookup_obj("missing")
+  root.find_by_property("color", "red")
+  root.objects["a"].objects["d"].properties["color"] = "red"
+  root.objects["e"].objects["f"] = Object()
+  del root.objects["a"].objects["b"]
+  root.objects["e"].properties["color"] = "blue"
+  root.objects["e"].properties.pop("color")
+  _check_indexes(root)
+  _check_indexes(root.objects["a"])
+
+
+def test_readd_replaces_in_place():
+  root = _tree(["a", "b", "c"])
+  root.lookup_obj("missing")
+  new = Object()
+  new.add_object("inner", Object())
+  root.add_object("b", new)
+  assert list(root.objects) == ["a", "b", "c"]
+  assert root.lookup_obj_parent("inner") is new
+  _check_indexes(root)
+
+
+def test_flatten_with_extends_does_not_modify_the_classes():
+  from modeling.library import Library
+  library = Library()
+  vehicle = Object()
+  vehicle.add_property("color", "grey")
+  wheel = Object()
+  wheel.add_property("radius", "16")
+  vehicle.add_object("wheel", wheel)
+  library.add_obj_class("vehicle", vehicle)
+  fleet = Object()
+  car = Object()
+  car.set_extends("vehicle")
+  car.add_property("color", "red")
+  fleet.add_object("car", car)
+  fleet.add_relation("free", Relation())
+  linked = Relation()
+  fleet.add_relation("linked", linked)
+  linked.add_from("car")
+
+  flat = fleet.flatten_with_extends(library)
+  assert type(flat) is Object
+  assert flat.properties == {"car": None, "car_color": "grey",
+                             "car_wheel": None, "car_wheel_radius": "16"}
+  assert list(flat.relations) == ["free"]
+  assert car.properties == {"color": "red"}
+  assert vehicle.properties == {"color": "grey"}
+  assert list(fleet.relations) == ["free", "linked"]
+
+
+def _random_tree(rand, size):
+  """Return an object with `size` sub-objects placed at random, having
+  random properties and relations."""
+  root = Object()
+  nodes, names = [root], []
+  for i in range(size):
+    obj = Object()
+    if rand.random() < 0.5:
+      obj.add_property("level", str(rand.randint(0, 2)))
+    rand.choice(nodes).add_object("o" + str(i), obj)
+    nodes.append(obj)
+    names.append("o" + str(i))
+  for obj in nodes:
+    for j in range(rand.randint(0, 2)):
+      rlt = Relation()
+      obj.add_relation("r" + str(j), rlt)
+      rlt.add_from(rand.choice(names + ["missing"]))
+      rlt.add_to(rand.choice(names))
+  return root
+
+
+def test_views_are_equal_to_the_copies():
+  import random
+  rand = random.Random(5)
+  for _ in range(50):
+    root = _random_tree(rand, rand.randint(1, 15))
+    for level in (0, 1, 2):
+      view = root.abst_obj(level, view=True)
+      assert str(view) == str(root.abst_obj(level))
+      assert str(view.materialize()) == str(view)
+      view = root.abst_obj_prop(level, view=True)
+      assert str(view) == str(root.abst_obj_prop(level))
+    view = root.keyword_abstraction("level", "1", view=True)
+    assert str(view) == str(root.keyword_abstraction("level", "1"))
+
+
+def test_views_share_the_viewed_object():
+  root = _tree(["a/b/c", "d"])
+  root.objects["a"].add_property("color", "red")
+  view = root.abst_obj(1, view=True)
+  assert list(view.objects) == ["a", "d"]
+  assert list(view.objects["a"].objects) == []
+  assert view.objects["a"].properties["color"] == "red"
+  with pytest.raises(TypeError):
+    view.objects["a"].properties["color"] = "blue"
+
+  copy = view.materialize()
+  assert type(copy) is Object
+  copy.objects["a"].remove_property("color")
+  assert root.objects["a"].properties == {"color": "red"}
+  assert "b" in root.objects["a"].objects
+
+
+def test_abstraction_relations_link_the_copies():
+  root = _tree(["a/b/c", "d"])
+  kept, dropped = Relation(), Relation()
+  root.add_relation("kept", kept)
+  kept.add_from("b")
+  kept.add_to("d")
+  root.add_relation("dropped", dropped)
+  dropped.add_from("c")
+
+  abst = root.abst_obj(2)
+  assert list(abst.relations) == ["kept"]
+  copy = abst.relations["kept"]
+  assert copy is not kept and copy.parent is abst
+  assert copy.fromSet["b"] is abst.objects["a"].objects["b"]
+  assert copy.toSet["d"] is abst.objects["d"]
+  assert list(root.relations) == ["kept", "dropped"]
+  assert "c" in root.objects["a"].objects["b"].objects
+
+
+def test_abstraction_of_a_deep_hierarchy():
+  # Deeper than the recursion limit
+  root = _tree(["/".join("o" + str(i) for i in range(1500))])
+  abst = root.abst_obj(1200)
+  assert abst.lookup_obj("o1199") is not None
+  assert abst.lookup_obj("o1200") is None
+  assert root.lookup_obj("o1499") is not None
+
+
+def test_iter_flat_follows_flatten():
+  import random
+  rand = random.Random(7)
+  for _ in range(20):
+    root = _random_tree(rand, rand.randint(1, 30))
+    root.add_property("name", "root")
+    assert list(root.iter_flat("_")) == list(root.flatten().properties.items())
+  root = _tree(["a/b"])
+  root.objects["a"].add_property("color", "red")
+  assert list(root.iter_flat()) == [(("a",), None), (("a", "color"), "red"),
+                                     (("a", "b"), None)]
+
+
+def _mutate(rand, root, count):
+  """Apply `count` random modifications to the sub-hierarchy of `root`."""
+  objs = [root] + [obj for _, _, obj in root._iter_entries()]
+  for _ in range(count):
+    i = rand.getrandbits(32)
+    obj = rand.choice(objs)
+    choice = rand.random()
+    if choice < 0.3:
+      obj.add_property("new" + str(i), "v")
+    elif choice < 0.5 and obj.properties:
+      obj.remove_property(next(iter(obj.properties)))
+    elif choice < 0.7 and obj.relations:
+      next(iter(obj.relations.values())).add_property("p" + str(i), "x")
+    else:
+      obj.add_object("n" + str(i), Object())
+
+
+def test_diff_follows_the_flattened_objects():
+  import random
+  rand = random.Random(3)
+  for seed in range(10):
+    left = _random_tree(random.Random(seed), 40)
+    right = _random_tree(random.Random(seed), 40)
+    assert diff(left, right) == ({}, {}, {})
+    _mutate(rand, left, 5)
+    _mutate(rand, right, 5)
+    flat_left = left.flatten().properties
+    flat_right = right.flatten().properties
+    result = diff(left, right)
+    assert {"_".join(path): value
+            for path, value in result.only_left.items()} == \
+           {key: value for key, value in flat_left.items()
+            if key not in flat_right}
+    assert {"_".join(path): value
+            for path, value in result.only_right.items()} == \
+           {key: value for key, value in flat_right.items()
+            if key not in flat_left}
+    assert {"_".join(path): values
+            for path, values in result.changed.items()} == \
+           {key: (value, flat_right[key]) for key, value in flat_left.items()
+            if key in flat_right and flat_right[key] != value}
+    assert sorted(iter_diff(left, right)) == sorted(
+      [("left", path, value, None)
+       for path, value in result.only_left.items()] +
+      [("right", path, None, value)
+       for path, value in result.only_right.items()] +
+      [("changed", path) + values for path, values in result.changed.items()])
+
+
+def test_fingerprints_follow_the_modifications():
+  import copy, random
+  rand = random.Random(11)
+  root = _random_tree(random.Random(1), 40)
+  other = _random_tree(random.Random(1), 40)
+  assert root == other and hash(root) == hash(other)
+  for _ in range(30):
+    root.fingerprint()
+    _mutate(rand, root, 1)
+    # The copy computes its fingerprint from scratch
+    assert root.fingerprint() == copy.deepcopy(root).fingerprint()
+  assert root != other
+
+  wheel = Object()
+  car, truck = Object(), Object()
+  car.add_object("wheel", wheel)
+  truck.add_object("wheel", wheel)
+  before = car.fingerprint(), truck.fingerprint()
+  wheel.add_property("radius", "16")
+  assert car.fingerprint() != before[0]
+  assert truck.fingerprint() != before[1]
+  assert car == truck
+
+
+def _relations_linking(root, name):
+  """Return the set of id() of the relations of the hierarchy of `root`
+  linking an object named `name`, found without the reverse indexes."""
+  result = set()
+  for obj in [root] + [obj for _, _, obj in root._iter_entries()]:
+    for rlt in obj.relations.values():
+      if name in rlt.fromSet or name in rlt.toSet:
+        result.add(id(rlt))
+  return result
+
+
+def test_lookup_relations_follows_the_removals():
+  import copy, random
+  rand = random.Random(2)
+  root = _random_tree(rand, 60)
+  root.remove_unvalid_relations()
+  for _ in range(40):
+    name = "o" + str(rand.randrange(60))
+    assert {id(rlt) for rlt in root.lookup_relations(name)} == \
+           _relations_linking(root, name)
+    entries = list(root._iter_entries())
+    if not entries:
+      break
+    parent, name, obj = rand.choice(entries)
+    parent.remove_object(name, remove_relations=True)
+    expected = copy.deepcopy(root)
+    expected.remove_unvalid_relations()
+    assert str(root) == str(expected)
+
+
+def test_lookup_relations_follows_the_relation_changes():
+  import random
+  rand = random.Random(3)
+  root = _tree(["o" + str(i) for i in range(20)])
+  names = list(root.objects)
+  root.lookup_relations("o0")
+  relations = []
+  for i in range(1000):
+    choice = rand.random()
+    if choice < 0.2 or not relations:
+      rlt = Relation()
+      root.add_relation("r" + str(i), rlt)
+      relations.append(rlt)
+    elif choice < 0.5:
+      rand.choice(relations).add_from(rand.choice(names))
+    elif choice < 0.7:
+      rand.choice(relations).add_to(rand.choice(names))
+    elif choice < 0.85:
+      rlt = rand.choice(relations)
+      if rlt.fromSet:
+        rlt.rm_from(rand.choice(list(rlt.fromSet)))
+    else:
+      rlt = rand.choice(relations)
+      if rlt.toSet:
+        rlt.rm_to(rand.choice(list(rlt.toSet)))
+  # The reverse index is updated, not rebuilt
+  assert root._endpoints is not None
+  for name in names:
+    assert {id(rlt) for rlt in root.lookup_relations(name)} == \
+           _relations_linking(root, name)
+
+
+def test_lazy_copies_behave_as_deep_copies():
+  import copy, random
+  for seed in range(5):
+    rand = random.Random(seed)
+    template = _random_tree(rand, 60)
+    before = str(template)
+    instance = template.lazy_copy()
+    assert str(instance) == before and instance == template
+    assert str(instance.abst_obj(2)) == str(template.abst_obj(2))
+    assert str(instance.flatten()) == str(template.flatten())
+
+    instance = template.lazy_copy()
+    expected = copy.deepcopy(template)
+    for i in range(30):
+      name = "o" + str(rand.randrange(60))
+      obj, other = instance.lookup_obj(name), expected.lookup_obj(name)
+      assert (obj is None) == (other is None)
+      if obj is None:
+        continue
+      choice = rand.randrange(4)
+      for target in (obj, other):
+        if choice == 0:
+          target.add_property("k" + str(i), "v")
+        elif choice == 1:
+          target.properties["level"] = "changed"
+        elif choice == 2 and target.objects:
+          target.remove_object(next(iter(target.objects)),
+                               remove_relations=True)
+        else:
+          target.add_object("new" + str(i), Object())
+      assert str(instance) == str(expected)
+      assert instance.fingerprint() == expected.fingerprint()
+    assert str(template) == before
+
+    plain = copy.deepcopy(instance)
+    assert str(plain) == str(instance)
+    assert all(type(obj) is Object
+               for obj in [plain] + [obj for _, _, obj in plain._iter_entries()])
+
+
+def test_shared_instances_of_the_library():
+  from modeling.library import Library
+  library = Library()
+  wheel = Object()
+  wheel.add_property("size", "16")
+  wheel.add_object("tire", Object())
+  library.add_obj_class("wheel", wheel)
+  big_wheel = Object()
+  big_wheel.set_extends("wheel")
+  big_wheel.add_property("brand", "x")
+  library.add_obj_class("big_wheel", big_wheel)
+
+  shared = library.instanciate_obj("big_wheel", shared=True)
+  assert str(shared) == str(library.instanciate_obj("big_wheel"))
+  shared.add_property("color", "red")
+  shared.objects["tire"].add_property("width", "225")
+  assert "color" not in library.instanciate_obj("big_wheel").properties
+  assert wheel.properties == {"size": "16"}
+  assert wheel.objects["tire"].properties == {}
+
+
+def test_bulk_add_is_equal_to_the_additions(capsys):
+  expected = _tree(["a/x"])
+  expected.lookup_obj("x")
+  expected.add_object("b", _tree(["y"]))
+  expected.add_property("color", "red")
+  rlt = Relation()
+  expected.add_relation("link", rlt)
+  rlt.add_from("b")
+  rlt.add_to("y")
+  capsys.readouterr()
+
+  root = _tree(["a/x"])
+  root.lookup_obj("x")
+  rlt = Relation()
+  with root.batch() as batch:
+    batch.add_object("b", _tree(["y"]))
+    batch.add_property("color", "red")
+    batch.add_relation("link", rlt, ["b", "missing"], ["y"])
+    # The relation is only modified when the block ends
+    assert rlt.fromSet == {} and "b" not in root.objects
+  assert rlt.fromSet["b"] is root.objects["b"]
+  rlt.rm_from("missing")
+  assert str(root) == str(expected)
+  assert root.lookup_obj_parent("y") is root.objects["b"]
+  _check_indexes(root)
+  assert capsys.readouterr().out.count("missing") == 1
+
+
+@pytest.mark.parametrize("arguments", [
+  {"objects": {"": Object()}}, {"objects": {"b": "not an object"}},
+  {"properties": {"color": "blue"}}, {"properties": {"size": 1}},
+  {"relations": {"link": Object()}}])
+def test_bulk_add_adds_nothing_if_an_argument_is_invalid(arguments):
+  root = _tree(["a"])
+  root.add_property("color", "red")
+  before = str(root)
+  valid = {"objects": {"c": Object()}, "properties": {"new": "1"},
+           "relations": {"other": Relation()}}
+  valid.update(arguments)
+  with pytest.raises(Exception):
+    root.bulk_add(**valid)
+  assert str(root) == before
+
+
+def test_batch_adds_nothing_on_error():
+  root = _tree(["a"])
+  with pytest.raises(KeyError):
+    with root.batch() as batch:
+      batch.add_object("b", Object())
+      raise KeyError("b")
+  assert list(root.objects) == ["a"]
+  extending = Object()
+  extending.set_extends("class")
+  with pytest.raises(TypeError):
+    extending.bulk_add(objects={"b": Object()}, properties={"color": "red"})
+  assert extending.properties == {}
+
+
+def test_property_index_follows_the_modifications():
+  import random
+  rand = random.Random(1)
+  root = _random_tree(rand, 300)
+  objs = [obj for _, _, obj in root._iter_entries()]
+  root.find_by_property("level", "1")
+  middle = objs[10]
+  middle.find_by_property("level", "1")
+  for i in range(200):
+    obj = rand.choice(objs)
+    choice = rand.random()
+    if choice < 0.3:
+      if "level" in obj.properties:
+        obj.remove_property("level")
+      else:
+        obj.add_property("level", str(rand.randint(0, 2)))
+    elif choice < 0.5:
+      sub = _tree(["leaf"])
+      sub.add_property("level", "1")
+      sub.objects["leaf"].add_property("level", "2")
+      obj.add_object("n" + str(i), sub)
+      objs.append(sub)
+    elif choice < 0.6 and obj.objects:
+      obj.remove_object(rand.choice(list(obj.objects)))
+    elif choice < 0.7:
+      obj.bulk_add(properties={"x" + str(i): "1"},
+                   objects={"b" + str(i): Object()})
+    else:
+      obj.properties = {"level": "0"}
+  _check_indexes(root)
+  _check_indexes(middle)
+
+  shared = Object()
+  shared.add_property("level", "1")
+  objs[5].add_object("shared", shared)
+  objs[6].add_object("shared", shared)
+  _check_indexes(root)
+  shared.remove_property("level")
+  _check_indexes(root)
+
+
+def test_keyword_abstraction_with_the_property_index():
+  import random
+  indexed = _random_tree(random.Random(4), 300)
+  plain = _random_tree(random.Random(4), 300)
+  indexed.find_by_property("level", "1")
+  assert indexed._property_index is not None
+  assert str(indexed.keyword_abstraction("level", "1")) == \
+         str(plain.keyword_abstraction("level", "1"))
@@ -0,0 +1,72 @@
+import os
+
+from modeling.core import *
+from modeling.model import Model
+from modeling import journal
+
+
+def _saved_model(tmp_path, count=100):
+  root = Object()
+  for i in range(count):
+    obj = Object()
+    obj.add_property("number", str(i))
+    root.add_object("o" + str(i), obj)
+  root.add_property("a", "1")
+  root.add_property("b", "2")
+  model = Model()
+  model.obj = root
+  model.lib_path = "model.lib"
+  model.model_name = str(tmp_path / "model.model")
+  model.save()
+  return model
+
+
+def test_replay_keeps_the_order_of_the_containers(tmp_path):
+  model = _saved_model(tmp_path)
+  root = model.obj
+  root.add_object("new2", Object())
+  root.add_object("new1", Object())
+  wheel = root.objects["o3"]
+  root.remove_object("o3")
+  root.add_object("o3", wheel)
+  root.objects["o50"].add_property("color", "red")
+  root.objects["o7"] = Object()
+  root.remove_property("a")
+  root.add_property("a", "3")
+  root.properties["b"] = "4"
+  model.save(incremental=True)
+  assert os.path.exists(journal.journal_path(model.model_name))
+
+  loaded = Model.load(model.model_name).obj
+  assert list(loaded.objects) == list(root.objects)
+  assert list(loaded.objects)[-3:] == ["new2", "new1", "o3"]
+  assert list(loaded.properties.items()) == [("b", "4"), ("a", "3")]
+  assert repr(loaded) == repr(root)
+
+
+def test_replay_keeps_the_first_match_of_duplicate_names(tmp_path):
+  model = _saved_model(tmp_path)
+  root = model.obj
+  first = root.objects["o1"]
+  first.add_object("dup", Object())
+  root.objects["o2"].add_object("dup", Object())
+  model.save(incremental=True)
+  loaded = Model.load(model.model_name).obj
+  assert loaded.lookup_obj_parent("dup") is loaded.objects["o1"]
+
+
+def test_modifications_are_only_recorded_once_saved(tmp_path):
+  root = Object()
+  for i in range(100):
+    root.add_object("o" + str(i), Object())
+    root.remove_object("o" + str(i))
+  assert root.is_dirty()
+  assert root._dirty is True
+  assert list(journal.iter_records(root)) == []
+
+  model = _saved_model(tmp_path)
+  assert not model.obj.is_dirty()
+  model.obj.objects["o1"].add_property("color", "red")
+  assert model.obj.is_dirty()
+  assert list(journal.iter_records(model.obj)) == \
+    [["set", ["o1"], "properties", "color", "red"]]
@@ -0,0 +1,152 @@
+import pytest
+
+from modeling.core import *
+from modeling.library import *
+
+
+def _chain(library, length):
+  """Add the classes c0 <- c1 <- ... of a chain of extends of `length`
+  classes, c<i> having the property p<i % 10> => i."""
+  for i in range(length):
+    obj = Object()
+    if i:
+      obj.set_extends("c" + str(i - 1))
+    obj.add_property("p" + str(i % 10), str(i))
+    library.add_obj_class("c" + str(i), obj)
+
+
+def test_resolve_a_long_chain_of_classes():
+  library = Library()
+  _chain(library, 3000)
+  instance = library.instanciate_obj("c2999")
+  assert instance.properties["p0"] == "2990"
+  assert instance.properties["p9"] == "2999"
+  assert instance.extends is None
+
+
+def test_resolved_classes_follow_the_modifications():
+  library = Library()
+  _chain(library, 3)
+  assert library.instanciate_obj("c2").properties["p0"] == "0"
+  # Direct writes to the classes
+  library.dic_obj["c0"].properties["p0"] = "changed"
+  assert library.instanciate_obj("c2").properties["p0"] == "changed"
+  library.dic_obj["c1"].properties["extra"] = "1"
+  assert library.instanciate_obj("c2", shared=True).properties["extra"] == "1"
+  # Replacement of a class of the chain
+  replacement = Object()
+  replacement.add_property("p0", "replaced")
+  library.dic_obj["c0"] = replacement
+  assert library.instanciate_obj("c2").properties["p0"] == "replaced"
+  # The resolved classes are not modified by the instances
+  instance = library.instanciate_obj("c2")
+  instance.add_property("local", "1")
+  assert "local" not in library.instanciate_obj("c2").properties
+
+
+def test_resolve_a_cycle_of_classes():
+  library = Library()
+  _chain(library, 3)
+  library.dic_obj["c0"].set_extends("c2")
+  with pytest.raises(DependencyCycleError) as error:
+    library.instanciate_obj("c1")
+  assert set(error.value.cycle) == {"c0", "c1", "c2"}
+
+
+def _graph(dependencies):
+  """Return the Dependency_graph of the {name: names it depends on}
+  dictionary `dependencies`."""
+  graph = Dependency_graph()
+  for name in dependencies:
+    graph.add_class(name, Dependency(name, name))
+  for name, names in dependencies.items():
+    for other in names:
+      graph.add_dependency(name, other)
+  return graph
+
+
+def test_dependency_order():
+  import random
+  rand = random.Random(4)
+  names = ["n" + str(i) for i in range(300)]
+  dependencies = {name: set(rand.sample(names[:i], min(i, rand.randint(0, 3))))
+                  for i, name in enumerate(names)}
+  shuffled = list(names)
+  rand.shuffle(shuffled)
+  ordered = list(_graph({name: dependencies[name] for name in shuffled}).build())
+  assert len(ordered) == len(names) and set(ordered) == set(names)
+  position = {name: i for i, name in enumerate(ordered)}
+  for name, names in dependencies.items():
+    assert all(position[other] < position[name] for other in names)
+
+
+def test_dependency_cycle_is_reported():
+  graph = _graph({"a": [], "b": ["c"], "c": ["d"], "d": ["b"], "e": ["b"]})
+  with pytest.raises(DependencyCycleError) as error:
+    graph.build()
+  assert error.value.cycle == ["b", "c", "d"]
+  assert error.value.classes == {"b", "c", "d", "e"}
+  assert "b -> c -> d -> b" in str(error.value)
+
+
+def test_load_a_long_chain_of_classes():
+  # The subclasses come first, and the chain is deeper than the recursion
+  # limit
+  classes = {"c" + str(i): {"nature": "object", "extends": "c" + str(i - 1)}
+             for i in range(2999, 0, -1)}
+  classes["c0"] = {"nature": "object", "properties": {"p": "0"}}
+  library = Library()
+  library.load({"nature": "library", "objects": classes})
+  assert list(library.dic_obj)[0] == "c0"
+  assert library.instanciate_obj("c2999").properties == {"p": "0"}
+
+  classes["c0"]["extends"] = "c2999"
+  with pytest.raises(DependencyCycleError) as error:
+    Library().load({"nature": "library", "objects": classes})
+  assert len(error.value.cycle) == 3000
+
+
+def _library(prefix, count):
+  """Return a library with the object classes <prefix>0, ... and the
+  relation class <prefix>r."""
+  library = Library()
+  _chain(library, count)
+  for i in range(count):
+    library.rename_obj_class("c" + str(i), prefix + str(i))
+  for i in range(1, count):
+    library.dic_obj[prefix + str(i)].extends = prefix + str(i - 1)
+  rlt = Relation()
+  rlt.add_property("kind", prefix)
+  library.add_rlt_class(prefix + "r", rlt)
+  return library
+
+
+def test_shared_merge_is_equal_to_the_merge():
+  lib1, lib2 = _library("a", 5), _library("b", 5)
+  shared = Library.merge(lib1, lib2, shared=True)
+  assert repr(shared) == repr(Library.merge(lib1, lib2))
+  assert shared.instanciate_obj("b4").properties["p0"] == "0"
+  with pytest.raises(Exception):
+    Library.merge(lib1, lib1, shared=True)
+  overloaded = Library.merge(lib1, _library("a", 2), overloading=True,
+                             shared=True)
+  assert list(overloaded.dic_obj) == ["a0", "a1", "a2", "a3", "a4"]
+
+
+def test_shared_merge_does_not_modify_the_libraries():
+  lib1, lib2 = _library("a", 3), _library("b", 3)
+  before = repr(lib1), repr(lib2)
+  shared = Library.merge(lib1, lib2, shared=True)
+  shared.get_obj("a0").add_property("extra", "1")
+  shared.get_rlt("br").add_property("extra", "1")
+  assert shared.instanciate_obj("a2").properties["extra"] == "1"
+  shared.rename_obj_class("a1", "renamed")
+  shared.get_obj("renamed").add_property("other", "1")
+  shared.rm_obj_class("b2")
+  shared.add_obj_class("new", Object())
+  assert "b2" not in shared.dic_obj and "renamed" in shared.dic_obj
+  assert (repr(lib1), repr(lib2)) == before
+
+  # The later changes of the merged libraries are visible
+  lib2.add_obj_class("late", Object())
+  assert "late" in shared.dic_obj
@@ -0,0 +1,81 @@
+import os
+
+from modeling.core import *
+from modeling.model import Model
+
+
+def test_load_a_path_a_file_or_bytes(saved_model, tmp_path, monkeypatch):
+  model = saved_model()
+  expected = str(model.obj)
+  loaded = Model.load(model.model_name)
+  assert str(loaded.obj) == expected
+  assert repr(loaded.lib) == repr(model.lib)
+  with open(model.model_name, "rb") as model_file:
+    assert str(Model.load(model_file).obj) == expected
+  # The library of a bytes buffer is relative to the current directory
+  monkeypatch.chdir(tmp_path)
+  with open(model.model_name, "rb") as model_file:
+    data = model_file.read()
+  assert str(Model.load(data).obj) == expected
+  assert str(Model.load(bytearray(data)).obj) == expected
+
+
+def test_load_a_stream(saved_model):
+  model = saved_model()
+  loaded = Model.load(model.model_name, stream=True)
+  assert str(loaded.obj) == str(model.obj)
+  assert repr(loaded.lib) == repr(model.lib)
+  assert loaded.lib.instanciate_obj("car").objects["front"].extends == "wheel"
+
+
+def test_load_a_json_model_lazily(saved_model):
+  import copy, pickle
+  from modeling import core
+  model = saved_model()
+  loaded = Model.load(model.model_name, lazy=True)
+  root = loaded.obj
+  assert isinstance(root, core._JsonObject) and not root.is_dirty()
+  car = root.objects["car1"]
+  assert core._PROPERTIES_SLOT.__get__(car) is core._UNBUILT
+  assert car.properties["number"] == "1"
+  assert car._json is not None
+  car.objects, car.relations
+  # The json data is released once the object is built
+  assert car._json is None
+  assert str(root) == str(model.obj)
+  assert root.fingerprint() == model.obj.fingerprint()
+  assert type(copy.deepcopy(root)) is Object
+  assert type(pickle.loads(pickle.dumps(root))) is Object
+
+  root.objects["car3"].add_property("color", "red")
+  expected = str(root)
+  loaded.save()
+  assert str(Model.load(model.model_name).obj) == expected
+
+
+def test_load_an_old_model_lazily():
+  path = os.path.join(os.path.dirname(__file__), "..", "modeling", "examples",
+                      "car.model")
+  assert Model.load(path, lazy=True).obj._get_dict() == \
+         Model.load(path).obj._get_dict()
+
+
+def test_only_the_used_classes_are_built(saved_model, tmp_path):
+  model = saved_model()
+  loaded = Model.load(model.model_name)
+  classes = loaded.lib.dic_obj
+  # car is used by the model and depends on wheel
+  assert [id(obj) for obj in classes.built_values()] == \
+         [id(classes["wheel"]), id(classes["car"])]
+  assert len(loaded.lib.dic_rlt.built_values()) == 1
+  assert list(classes) == ["wheel", "car", "unused"]
+  assert not loaded.lib.is_dirty()
+
+  assert list(loaded.lib.instanciate_obj("unused").objects) == ["front", "back"]
+  assert len(classes.built_values()) == 3
+  loaded.lib.save(str(tmp_path / "saved.lib"))
+  with open(str(tmp_path / "saved.lib"), encoding="utf-8") as saved, \
+       open(str(tmp_path / "model.lib"), encoding="utf-8") as original:
+    assert saved.read() == original.read()
+  assert Model.load(model.model_name, lazy=True).lib.dic_obj.built_values() \
+         == []
@@ -0,0 +1,114 @@
+import io
+import os
+import json
+
+import pytest
+
+from modeling.core import *
+from modeling.stream import *
+
+
+_DATA = {"text": "café à \"quoted\" \\ \n 🚗 " + "long" * 100,
+         "numbers": [0, -1, 12, 1.5, -2e-3, 1E10, 3.25e+2],
+         "literals": [True, False, None], "empty": [{}, [], ""],
+         "nested": {"a": [{"b": [[1, 2], {"c": "d"}]}]}}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 16])
+def test_load_json_follows_json_loads(chunk_size):
+  for indent in (None, 1):
+    text = json.dumps(_DATA, indent=indent, ensure_ascii=False)
+    assert load_json(io.StringIO(text), chunk_size=chunk_size) == _DATA
+    data = text.encode("utf-8")
+    assert load_json(io.BytesIO(data), chunk_size=chunk_size) == _DATA
+    assert load_json(data, chunk_size=chunk_size) == _DATA
+
+
+def test_load_json_of_a_deep_file():
+  # Deeper than the recursion limit
+  text = "[" * 5000 + "]" * 5000
+  value = load_json(text.encode(), chunk_size=100)
+  for _ in range(4999):
+    value = value[0]
+  assert value == []
+
+
+@pytest.mark.parametrize("text", ['{"a" 1}', '{"a": 1,}', '[1 2]', '[1,]',
+                                  '{"a": 1', '[1] 2', 'nul', '{1: 2}', ''])
+def test_load_json_of_invalid_json(text):
+  with pytest.raises(json.JSONDecodeError):
+    load_json(text.encode(), chunk_size=2)
+
+
+def test_load_json_builds_the_objects():
+  root = Object()
+  child = Object()
+  child.add_property("name", "café")
+  root.add_object("child", child)
+  child.add_object("leaf", Object())
+  rlt = Relation()
+  rlt.add_from("child")
+  rlt.add_to("leaf")
+  root.add_relation("link", rlt)
+  json_root = load_json(str(root).encode(), chunk_size=5)
+  assert type(json_root) is dict
+  assert isinstance(json_root["objects"]["child"], Object)
+  assert isinstance(json_root["relations"]["link"], Relation)
+  assert str(Object.new(json_root, None)) == str(root)
+
+
+def _object():
+  root = Object()
+  child = Object()
+  child.add_property("name", "café")
+  root.add_object("child", child)
+  leaf = Object()
+  leaf.set_extends("class")
+  child.add_object("leaf", leaf)
+  root.add_property("empty", "")
+  rlt = Relation()
+  root.add_relation("link", rlt)
+  rlt.add_from("child")
+  rlt.add_to("leaf")
+  rlt.set_directional(False)
+  return root
+
+
+@pytest.mark.parametrize("indent", [None, 0, 1, 4, "\t"])
+def test_iter_json_follows_json_dumps(indent):
+  assert "".join(iter_json(_DATA, indent)) == json.dumps(_DATA, indent=indent)
+  root = _object()
+  assert "".join(iter_json(root, indent)) == \
+         json.dumps(root._get_dict(), indent=indent)
+  view = root.abst_obj(1, view=True)
+  assert "".join(iter_json(view, indent)) == \
+         json.dumps(view._get_dict(), indent=indent)
+
+
+def test_save_json_of_a_deep_object(tmp_path):
+  root = Object()
+  obj = root
+  for i in range(2000):
+    sub = Object()
+    obj.add_object("o" + str(i), sub)
+    obj = sub
+  path = str(tmp_path / "deep.model")
+  save_json(root, path, buffer_size=100)
+  obj = load_json(path)["objects"]["o0"]
+  for i in range(1, 2000):
+    obj = obj.objects["o" + str(i)]
+  assert obj.objects == {}
+
+
+def test_save_json_is_atomic(tmp_path):
+  path = str(tmp_path / "model.model")
+  save_json(_object(), path, buffer_size=10)
+  with open(path, encoding="utf-8") as model_file:
+    assert model_file.read() == str(_object())
+
+  # A value which cannot be written after the first chunks
+  with pytest.raises(TypeError):
+    save_json({"objects": _object(), "error": object()}, path, buffer_size=10)
+  with open(path, encoding="utf-8") as model_file:
+    assert model_file.read() == str(_object())
+  assert os.listdir(str(tmp_path)) == ["model.model"]
@@ -0,0 +1,70 @@
+import pytest
+
+from modeling import typechecker
+from modeling.typechecker import *
+
+
+@pytest.fixture
+def mode():
+  """Set the mode given to the fixture, restoring the previous one after the
+  test."""
+  previous = typechecker._mode
+  yield typechecker.set_mode
+  typechecker.set_mode(previous)
+
+
+def _functions():
+  """Return functions decorated in the current mode."""
+  @typecheck
+  def positional(i: int, s: str = "default", x=None) -> bool:
+    return i > 0
+
+  @typecheck
+  def keywords(*args, k1: int, k2: optional(str) = None) -> nothing:
+    pass
+
+  @typecheck
+  def checkers(n: either(int, by_regex("^[0-9]+$")), l: list_of(str),
+               level: one_of(1, 2, 3) = 1) -> lambda x: x % 2 == 0:
+    return len(l)
+
+  return positional, keywords, checkers
+
+
+_CALLS = [
+  (0, (1,), {}), (0, (1, "s"), {}), (0, ("1",), {}), (0, (1, 2), {}),
+  (1, (), {"k1": 1}), (1, (), {"k1": "1"}), (1, (), {"k1": 1, "k2": 2}),
+  (1, (), {}),
+  (2, (1, ["a", "b"]), {}), (2, ("12", ["a", "b"], 3), {}),
+  (2, ("a", []), {}), (2, (1, [1, 2]), {}), (2, (1, ["a", "b"], 4), {}),
+  (2, (1, ["a"]), {}),
+]
+
+
+def _outcome(function, args, kwargs):
+  try:
+    return function(*args, **kwargs)
+  except TypeCheckError as error:
+    return type(error), str(error)
+
+
+def test_fast_mode_does_the_same_checks(mode):
+  mode("full")
+  full = _functions()
+  mode("fast")
+  fast = _functions()
+  for index, args, kwargs in _CALLS:
+    assert _outcome(fast[index], args, kwargs) == \
+           _outcome(full[index], args, kwargs)
+  assert fast[0].__name__ == "positional"
+  assert isinstance(_outcome(fast[0], ("1",), {}), tuple)
+
+
+def test_off_mode_returns_the_functions(mode):
+  def function(i: int) -> int:
+    return i
+  mode("off")
+  assert typecheck(function) is function
+  assert _functions()[1](k1="1") is None
+  with pytest.raises(ValueError):
+    mode("unknown")